@@ -30,6 +30,16 @@ sess = Session()
 limiter = None
 _registration_cache = {}  # Cached result for registration check (single-user app)
 
+
+def is_registration_available():
+    """Check if registration is open (no user exists yet).
+    Cached in-memory since this is a single-user app - cleared on registration."""
+    if 'available' not in _registration_cache:
+        from app.models import User
+        _registration_cache['available'] = db.session.query(User.id).limit(1).first() is None
+    return _registration_cache['available']
+
+
 # Enable WAL mode for ALL SQLite connections (class-level, fires for every connection)
 # WAL allows concurrent reads during writes - prevents 504 timeouts
 from sqlalchemy import event
@@ -234,10 +244,7 @@ def create_app(config_name=None):
     def inject_registration_status():
         """Make registration_available variable available to all templates.
         Cached in-memory since this is a single-user app - value only changes on registration."""
-        if 'available' not in _registration_cache:
-            from app.models import User
-            _registration_cache['available'] = (User.query.count() == 0)
-        return dict(registration_available=_registration_cache['available'])
+        return dict(registration_available=is_registration_available())
 
     # CSRF error handler - redirects to login with message when session expires
     @app.errorhandler(CSRFError)
@@ -4,7 +4,7 @@ from flask_login import current_user, login_user, logout_user, login_required
 from app.auth import auth_bp
 from app.auth.forms import LoginForm, RegistrationForm, ChangePasswordForm
 from app.models import User, ActivityLog
-from app import db
+from app import db, is_registration_available
 from app.utils.rate_limiter import auth_rate_limit
 
 def log_activity(action, details=None, status='success', error_message=None):
@@ -42,7 +42,7 @@ def login():
         return redirect(url_for('main.dashboard'))
 
     # Check if registration is available (no users exist yet)
-    registration_available = (User.query.count() == 0)
+    registration_available = is_registration_available()
 
     form = LoginForm()
     if form.validate_on_submit():
@@ -89,9 +89,8 @@ def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
 
-    # SINGLE-USER APP: Check if admin already exists
-    user_count = User.query.count()
-    if user_count > 0:
+    # SINGLE-USER APP: Check if admin already exists (authoritative, not cached)
+    if db.session.query(User.id).limit(1).first() is not None:
         # Registration is closed - admin already exists
         current_app.logger.warning(
             'Registration attempt blocked - admin already exists',
@@ -111,7 +110,7 @@ def register():
     if form.validate_on_submit():
         try:
             # Double-check no user was created in the meantime
-            if User.query.count() > 0:
+            if db.session.query(User.id).limit(1).first() is not None:
                 flash('Registration is closed. Another admin has already been registered.', 'error')
                 return redirect(url_for('auth.login'))
 
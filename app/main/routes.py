@@ -1,13 +1,14 @@
 from flask import render_template, redirect, url_for, current_app, jsonify, request
 from flask_login import login_required, current_user
 from app.main import main_bp
-from app.models import TradingAccount, ActivityLog, User
+from app.models import TradingAccount, ActivityLog
 from openalgo import api
 from datetime import datetime
-from sqlalchemy import desc, func, case, and_, or_
-from sqlalchemy.orm import joinedload
-from app import db
+from sqlalchemy import desc, func
+from sqlalchemy.orm import joinedload, raiseload
+from app import db, is_registration_available
 from app.utils.time_utils import format_timestamp_to_ist
+from app.utils.strategy_stats import get_strategy_pnl, get_today_pnl, get_leg_counts
 import json
 
 @main_bp.route('/')
@@ -16,7 +17,7 @@ def index():
         return redirect(url_for('main.dashboard'))
 
     # Check if registration is available (single-user app - only if no users exist)
-    registration_available = (User.query.count() == 0)
+    registration_available = is_registration_available()
 
     return render_template('main/index.html', registration_available=registration_available)
 
@@ -29,15 +30,17 @@ def dashboard():
     to avoid N+1 query problem (was 90+ queries, now 3 queries).
     """
     from app.models import Strategy, StrategyExecution
-    from datetime import datetime, timedelta
     from collections import defaultdict
 
-    # Get user's strategies
-    strategies = Strategy.query.filter_by(user_id=current_user.id).order_by(Strategy.created_at.desc()).all()
+    # Get user's strategies (raiseload: every relationship the page needs is
+    # aggregated below, so any lazy load here is an N+1 and should fail fast)
+    strategies = Strategy.query.options(raiseload('*')).filter_by(
+        user_id=current_user.id
+    ).order_by(Strategy.created_at.desc()).all()
     strategy_ids = [s.id for s in strategies]
 
     # Get user's active accounts
-    accounts = TradingAccount.query.filter_by(
+    accounts = TradingAccount.query.options(raiseload('*')).filter_by(
         user_id=current_user.id,
         is_active=True
     ).all()
@@ -49,57 +52,9 @@ def dashboard():
     # OPTIMIZATION: Use SQL aggregation instead of loading all executions into Python.
     # Loading 1000+ ORM objects over TCP is slow with PostgreSQL (~500ms-1s).
     # SQL aggregation returns a few rows and PostgreSQL does the heavy lifting (~5ms).
-    strategy_pnl = {}
-    today_pnl = 0
-
-    if strategy_ids:
-        # Query 1: Per-strategy P&L via SQL SUM/GROUP BY (returns N rows for N strategies)
-        pnl_filter = and_(
-            StrategyExecution.status.notin_(['error', 'failed']),
-            or_(
-                StrategyExecution.broker_order_status.is_(None),
-                StrategyExecution.broker_order_status.notin_(['rejected', 'cancelled'])
-            )
-        )
-        pnl_rows = db.session.query(
-            StrategyExecution.strategy_id,
-            func.coalesce(func.sum(case(
-                (pnl_filter, StrategyExecution.realized_pnl),
-                else_=None
-            )), 0).label('realized'),
-            func.coalesce(func.sum(case(
-                (and_(pnl_filter, StrategyExecution.status == 'entered'),
-                 StrategyExecution.unrealized_pnl),
-                else_=None
-            )), 0).label('unrealized')
-        ).filter(
-            StrategyExecution.strategy_id.in_(strategy_ids)
-        ).group_by(StrategyExecution.strategy_id).all()
-
-        for row in pnl_rows:
-            realized = float(row.realized or 0)
-            unrealized = float(row.unrealized or 0)
-            strategy_pnl[row.strategy_id] = {
-                'realized': realized,
-                'unrealized': unrealized,
-                'total': realized + unrealized
-            }
-
-        # Query 2: Today's realized P&L via SQL SUM (returns 1 scalar)
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_pnl_result = db.session.query(
-            func.coalesce(func.sum(StrategyExecution.realized_pnl), 0)
-        ).filter(
-            StrategyExecution.strategy_id.in_(strategy_ids),
-            StrategyExecution.created_at >= today_start,
-            StrategyExecution.realized_pnl.isnot(None),
-            StrategyExecution.status != 'failed',
-            or_(
-                StrategyExecution.broker_order_status.is_(None),
-                StrategyExecution.broker_order_status.notin_(['rejected', 'cancelled'])
-            )
-        ).scalar()
-        today_pnl = float(today_pnl_result or 0)
+    strategy_pnl = get_strategy_pnl(strategy_ids)
+    today_pnl = get_today_pnl(strategy_ids)
+    leg_counts = get_leg_counts(strategy_ids)
 
     # Get active strategy count
     active_strategies = [s for s in strategies if s.is_active]
@@ -209,6 +164,7 @@ def dashboard():
                          today_pnl=today_pnl,
                          active_strategies=len(active_strategies),
                          account_strategies=account_strategies,
+                         leg_counts=leg_counts,
                          overall_stats=overall_stats)
 
 @main_bp.route('/account-positions')
@@ -5,7 +5,9 @@ from app.strategy import strategy_bp
 from app.models import Strategy, StrategyLeg, StrategyExecution, TradingAccount, TradeQuality
 from app.utils.rate_limiter import api_rate_limit, heavy_rate_limit
 from app.utils.strategy_executor import StrategyExecutor
+from app.utils.strategy_stats import get_strategy_pnl, get_today_pnl, get_leg_counts
 from datetime import datetime, timedelta
+from sqlalchemy.orm import raiseload
 import json
 import logging
 
@@ -17,29 +19,23 @@ from app.utils.time_utils import utc_to_ist, format_trade_timestamp, format_time
 @login_required
 def dashboard():
     """Strategy dashboard showing active strategies and account status"""
-    # Get user's strategies
-    strategies = Strategy.query.filter_by(user_id=current_user.id).order_by(Strategy.created_at.desc()).all()
+    # Get user's strategies (raiseload: relationship data is aggregated below)
+    strategies = Strategy.query.options(raiseload('*')).filter_by(
+        user_id=current_user.id
+    ).order_by(Strategy.created_at.desc()).all()
+    strategy_ids = [s.id for s in strategies]
 
     # Get user's active accounts
-    accounts = TradingAccount.query.filter_by(
+    accounts = TradingAccount.query.options(raiseload('*')).filter_by(
         user_id=current_user.id,
         is_active=True
     ).all()
 
-    # Calculate today's P&L across all strategies
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_executions = StrategyExecution.query.join(Strategy).filter(
-        Strategy.user_id == current_user.id,
-        StrategyExecution.created_at >= today_start
-    ).all()
-
-    # Calculate P&L only from successful executions (exclude rejected/failed)
-    today_pnl = sum(
-        e.realized_pnl or 0
-        for e in today_executions
-        if e.realized_pnl and e.status != 'failed'
-        and not (hasattr(e, 'broker_order_status') and e.broker_order_status in ['rejected', 'cancelled'])
-    )
+    # Execution aggregates run as SQL SUM/COUNT ... GROUP BY over
+    # strategy_id IN (...) and are skipped when the user has no strategies
+    today_pnl = get_today_pnl(strategy_ids)
+    strategy_pnl = get_strategy_pnl(strategy_ids)
+    leg_counts = get_leg_counts(strategy_ids)
 
     # Get active strategy count
     active_strategies = [s for s in strategies if s.is_active]
@@ -47,6 +43,7 @@ def dashboard():
     # Convert strategies to dictionaries for JSON serialization
     strategies_data = []
     for strategy in strategies:
+        pnl = strategy_pnl.get(strategy.id, {'realized': 0, 'unrealized': 0, 'total': 0})
         strategies_data.append({
             'id': strategy.id,
             'name': strategy.name,
@@ -61,10 +58,10 @@ def dashboard():
             'max_loss': strategy.max_loss,
             'max_profit': strategy.max_profit,
             'trailing_sl': strategy.trailing_sl,
-            # Per-strategy P&L calculation using new properties
-            'total_pnl': strategy.total_pnl,
-            'realized_pnl': strategy.realized_pnl,
-            'unrealized_pnl': strategy.unrealized_pnl
+            # Per-strategy P&L from the aggregate query above
+            'total_pnl': pnl['total'],
+            'realized_pnl': pnl['realized'],
+            'unrealized_pnl': pnl['unrealized']
         })
 
     # Convert accounts to dictionaries for JSON serialization
@@ -84,6 +81,7 @@ def dashboard():
                          accounts=accounts,
                          accounts_json=accounts_data,
                          today_pnl=today_pnl,
+                         leg_counts=leg_counts,
                          active_strategies=len(active_strategies))
 
 @strategy_bp.route('/create-new', methods=['GET'])
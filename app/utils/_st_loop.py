@@ -0,0 +1,151 @@
+"""
+Compiled Supertrend recurrence
+
+The bar-by-bar band/direction update is a loop-carried recurrence that cannot
+be vectorised, so it is compiled with Numba. When Numba is not available the
+decorator degrades to a no-op and the same code runs as plain Python.
+"""
+import math
+
+import numpy as np
+
+try:
+    from numba import njit, types
+
+    # Inputs are typed read-only so pandas-backed (possibly read-only) views
+    # match the same compiled specialisation as freshly allocated arrays
+    _f8 = types.Array(types.float64, 1, 'A')
+    _f8_in = types.Array(types.float64, 1, 'A', readonly=True)
+    _SUPERTREND_LOOP_SIG = types.Tuple((_f8, _f8, _f8, _f8, types.float64))(
+        _f8_in, _f8_in, _f8_in, types.int64, types.float64
+    )
+except ImportError:  # pragma: no cover - numba is a pinned dependency
+    _SUPERTREND_LOOP_SIG = None
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+
+# Explicit signature: compiled at import (and reused from the on-disk cache)
+# rather than on the first call. app.utils.supertrend imports this module at
+# the top, and create_app imports that via the Supertrend exit service, so
+# compilation happens at app start rather than inside a request
+@njit(_SUPERTREND_LOOP_SIG, cache=True)
+def _supertrend_loop(high, low, close, period, multiplier):
+    """
+    Wilder ATR and Pine Script Supertrend recurrence fused into one pass
+
+    The ATR matches OpenAlgo's atr_wilder (TR[0] = high - low, SMA seed over
+    the first period bars, then Wilder smoothing) but is kept in a scalar,
+    so no intermediate ATR array is allocated. Callers must ensure
+    len(close) >= period.
+
+    A non-finite high, low or close leaves the ATR undefined from that bar
+    on, so that bar and every later one are NaN (no signal) instead of
+    carrying the last finite band forward.
+
+    Returns:
+        Tuple of (supertrend, direction, final_upper, final_lower, last_atr)
+        with direction -1 for bullish, 1 for bearish and NaN during warmup
+    """
+    n = len(close)
+    first_valid = period - 1
+
+    # Every bar from first_valid onward is written by the loop, so only the
+    # warmup prefix needs NaN
+    supertrend = np.empty(n)
+    direction = np.empty(n)
+    final_upper = np.empty(n)
+    final_lower = np.empty(n)
+    supertrend[:first_valid] = np.nan
+    direction[:first_valid] = np.nan
+    final_upper[:first_valid] = np.nan
+    final_lower[:first_valid] = np.nan
+
+    # ATR seed: simple average of the first period true ranges
+    for i in range(period):
+        if not (math.isfinite(high[i]) and math.isfinite(low[i]) and math.isfinite(close[i])):
+            supertrend[first_valid:] = np.nan
+            direction[first_valid:] = np.nan
+            final_upper[first_valid:] = np.nan
+            final_lower[first_valid:] = np.nan
+            return supertrend, direction, final_upper, final_lower, np.nan
+
+    tr_sum = high[0] - low[0]
+    for i in range(1, period):
+        pc = close[i - 1]
+        tr_sum += max(high[i] - low[i], abs(high[i] - pc), abs(low[i] - pc))
+    atr = tr_sum / period
+
+    # Bands (src = hl2) are computed per bar, no band arrays are allocated
+    hl_avg = (high[first_valid] + low[first_valid]) / 2.0
+    offset = multiplier * atr
+
+    # Pine Script: if na(atr[1]) _direction := 1 (first bar is downtrend)
+    final_upper[first_valid] = hl_avg + offset
+    final_lower[first_valid] = hl_avg - offset
+    direction[first_valid] = 1.0
+    supertrend[first_valid] = final_upper[first_valid]
+
+    # Previous-bar values are carried in locals instead of re-indexing the arrays
+    prev_fu = final_upper[first_valid]
+    prev_fl = final_lower[first_valid]
+    prev_close = close[first_valid]
+    # Direction carried as a flag instead of comparing supertrend[i-1] with
+    # final_upper[i-1]; the first valid bar is a downtrend (upper band)
+    prev_up = True
+
+    for i in range(first_valid + 1, n):
+        h = high[i]
+        lo = low[i]
+        c = close[i]
+
+        if not (math.isfinite(h) and math.isfinite(lo) and math.isfinite(c)):
+            supertrend[i:] = np.nan
+            direction[i:] = np.nan
+            final_upper[i:] = np.nan
+            final_lower[i:] = np.nan
+            atr = np.nan
+            break
+
+        # Wilder-smoothed ATR
+        tr = max(h - lo, abs(h - prev_close), abs(lo - prev_close))
+        atr = (atr * (period - 1) + tr) / period
+
+        hl_avg = (h + lo) / 2.0
+        offset = multiplier * atr
+        ub = hl_avg + offset
+        lb = hl_avg - offset
+
+        # lowerBand > prevLowerBand or close[1] < prevLowerBand ? lowerBand : prevLowerBand
+        fl = lb if (lb > prev_fl or prev_close < prev_fl) else prev_fl
+
+        # upperBand < prevUpperBand or close[1] > prevUpperBand ? upperBand : prevUpperBand
+        fu = ub if (ub < prev_fu or prev_close > prev_fu) else prev_fu
+
+        if prev_up:
+            # Previous bar was on the upper band (downtrend)
+            d = -1.0 if c > fu else 1.0
+        else:
+            # Previous bar was on the lower band (uptrend)
+            d = 1.0 if c < fl else -1.0
+
+        st = fl if d == -1.0 else fu
+
+        final_lower[i] = fl
+        final_upper[i] = fu
+        direction[i] = d
+        supertrend[i] = st
+
+        prev_fl = fl
+        prev_fu = fu
+        prev_up = d == 1.0
+        prev_close = c
+
+    return supertrend, direction, final_upper, final_lower, atr
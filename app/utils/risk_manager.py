@@ -12,6 +12,7 @@ Key Features:
 Uses standard threading for background tasks
 """
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from decimal import Decimal
@@ -30,6 +31,7 @@ from app.models import (
     TradingAccount
 )
 from app.utils.openalgo_client import ExtendedOpenAlgoAPI
+from app.utils.shared_prices import read_shared_prices, read_redis_prices, create_redis_client
 
 logger = logging.getLogger(__name__)
 
@@ -245,6 +247,9 @@ class RiskManager:
         self._failed_accounts: Dict[int, datetime] = {}  # Track failed accounts with timestamp
         self._failed_account_cooldown = 60  # Retry failed account after 60 seconds
 
+        # Service's Redis price mirror, for when it runs on another host
+        self._price_redis = create_redis_client()
+
         logger.debug("RiskManager initialized")
 
     def _get_prices_with_failover(self) -> Dict[str, float]:
@@ -512,8 +517,11 @@ class RiskManager:
         Calculate total P&L for a strategy across all executions.
 
         PRICE SOURCES (in order of preference):
-        1. PRIMARY: WebSocket prices from execution.last_price (updated by position_monitor)
-        2. FALLBACK: REST API (positionbook) only if WebSocket price is stale (>30s old)
+        1. PRIMARY: Shared-memory price table written per tick by the
+           WebSocket service (read in place, no DB round-trip), or its Redis
+           mirror when the service runs on another host
+        2. WebSocket prices from execution.last_price (persisted by the service)
+        3. FALLBACK: REST API (positionbook) only if neither is fresh (>60s old)
 
         This reduces API calls from ~12/min to nearly zero when WebSocket is working.
 
@@ -548,14 +556,29 @@ class RiskManager:
             api_prices = {}
             executions_with_fallback_price = 0  # Track how many executions use fallback
 
+            live_prices = {}  # execution id -> LTP from the shared price table
+
             if open_executions:
                 # Check if any execution is missing WebSocket price or has stale data
                 # Consider price stale if last_price_updated is missing or > 60 seconds old
                 now = datetime.now()
                 stale_threshold_seconds = 60
 
+                shared_prices = read_shared_prices()
+                if not shared_prices and self._price_redis is not None:
+                    # No table file on this host: use the service's Redis mirror
+                    shared_prices = read_redis_prices(self._price_redis)
+                if shared_prices:
+                    oldest_ns = time.time_ns() - stale_threshold_seconds * 1_000_000_000
+                    for exec in open_executions:
+                        quote = shared_prices.get(f"{exec.exchange or 'NFO'}:{exec.symbol}")
+                        if quote and quote['ltp'] > 0 and quote['timestamp_ns'] >= oldest_ns:
+                            live_prices[exec.id] = quote['ltp']
+
                 missing_ws_price = False
                 for exec in open_executions:
+                    if exec.id in live_prices:
+                        continue
                     if not exec.last_price or exec.last_price <= 0:
                         missing_ws_price = True
                         logger.debug(f"[P&L] {exec.symbol}: last_price missing or zero")
@@ -590,8 +613,13 @@ class RiskManager:
                 price_source = None
 
                 if execution.status == 'entered':
-                    # Try WebSocket price first (from position_monitor)
-                    if execution.last_price and execution.last_price > 0:
+                    # Freshest: the service's shared price table
+                    if execution.id in live_prices:
+                        current_price = live_prices[execution.id]
+                        price_source = 'shared_memory'
+                        logger.debug(f"[P&L] {execution.symbol}: Using shared-memory price {current_price}")
+                    # Then the WebSocket price persisted to the execution
+                    elif execution.last_price and execution.last_price > 0:
                         current_price = float(execution.last_price)
                         price_source = 'websocket'
                         logger.debug(f"[P&L] {execution.symbol}: Using WebSocket price {current_price}")
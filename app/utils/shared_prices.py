@@ -0,0 +1,288 @@
+"""
+Shared-memory price table
+The standalone WebSocket service writes the latest quote for each subscribed
+symbol into a fixed-size memory-mapped file; the main app maps the same file
+and reads it in place, without JSON parsing or file rewrites.
+
+Layout:
+    header (64 bytes): generation (u64), capacity (u32), count (u32)
+    slots: one per symbol, assigned on first use - a seq (u64) followed by
+           a PRICE_RECORD; a released slot is zeroed (empty symbol, skipped
+           by readers) and reused by the next new symbol, and count is the
+           high-water mark of slots ever assigned
+
+Each slot carries its own seqlock: the writer makes the slot seq odd before
+touching the record and even again afterwards, so a reader retries just that
+slot instead of taking a lock, and updates to different symbols never
+invalidate each other's reads. The header generation is bumped by clear().
+
+When REDIS_PRICE_PUBLISH is enabled the service also mirrors each flush to
+Redis, for readers on other hosts: the latest quote per "EX:SYM" in the
+REDIS_PRICES_KEY hash and every update on its REDIS_TICK_CHANNEL channel.
+The risk manager falls back to the hash (read_redis_prices) when the
+service runs on another host and the table file is absent.
+"""
+import os
+import json
+import mmap
+import math
+import struct
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SHARED_PRICES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'instance', 'websocket_data.mmap'
+)
+REDIS_PRICES_KEY = 'algomirror:prices'
+REDIS_TICK_CHANNEL = 'algomirror:tick:{}'  # formatted with "EXCHANGE:SYMBOL"
+# Mirror flushed prices to Redis hash + pub/sub (off unless enabled)
+REDIS_PRICE_PUBLISH = os.environ.get('REDIS_PRICE_PUBLISH', 'false').lower() == 'true'
+MAX_SYMBOLS = 512
+
+HEADER = struct.Struct('<QII')
+HEADER_SIZE = 64
+# symbol, exchange, ltp, open, high, low, close, volume, epoch_ns
+PRICE_RECORD = struct.Struct('<32s16sdddddQq')
+
+_SEQ = struct.Struct('<Q')
+SLOT_SIZE = _SEQ.size + PRICE_RECORD.size
+_COUNT = struct.Struct('<I')
+_COUNT_OFFSET = 12
+_EMPTY_RECORD = bytes(PRICE_RECORD.size)
+
+
+def _float(value):
+    """Quote field as float, NaN when missing"""
+    return math.nan if value is None else float(value)
+
+
+class SharedPriceWriter:
+    """Single-writer side of the shared price table"""
+
+    def __init__(self, path=SHARED_PRICES_PATH, max_symbols=MAX_SYMBOLS):
+        self.path = path
+        self.max_symbols = max_symbols
+        self._slots = {}  # (exchange, symbol) -> slot index
+        self._free_slots = []  # released slot indexes, reused before new ones
+        self._used = 0  # slots ever assigned (the published count)
+        self._slot_seqs = [0] * max_symbols  # writer's copy of each slot seq
+        self._slot_lock = threading.Lock()  # slot assignment vs release(), not per write
+        self._dropped = set()  # symbols already logged as not fitting
+        self._generation = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = HEADER_SIZE + max_symbols * SLOT_SIZE
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        # Zero any previous run's slots, whose seqs may have been left odd
+        self._mm[:] = bytes(size)
+        HEADER.pack_into(self._mm, 0, 0, max_symbols, 0)
+
+    def _slot_for(self, exchange, symbol):
+        """
+        Slot index for a symbol, assigning a released or the next unused slot
+        on first use
+
+        Returns:
+            Tuple of (slot, is_new); slot is None if the table is full
+        """
+        key = (exchange, symbol)
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot, False
+
+        with self._slot_lock:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            elif self._used < self.max_symbols:
+                slot = self._used
+                self._used += 1
+            else:
+                if key not in self._dropped:
+                    self._dropped.add(key)
+                    logger.warning(f"Shared price table full ({self.max_symbols} symbols), "
+                                   f"not sharing {exchange}:{symbol}")
+                return None, False
+            self._slots[key] = slot
+        return slot, True
+
+    def write(self, exchange, symbol, ltp, open_=None, high=None, low=None, close=None,
+              volume=None, timestamp_ns=0):
+        """
+        Write the latest quote for a symbol into its slot
+
+        Returns:
+            True if written, False if the table is full
+        """
+        slot, is_new = self._slot_for(exchange, symbol)
+        if slot is None:
+            return False
+
+        record = PRICE_RECORD.pack(
+            symbol.encode()[:32], (exchange or '').encode()[:16],
+            float(ltp), _float(open_), _float(high), _float(low), _float(close),
+            int(volume or 0), timestamp_ns
+        )
+        self._write_slot(slot, record)
+        if is_new:
+            # Published only once the slot holds a complete record
+            _COUNT.pack_into(self._mm, _COUNT_OFFSET, self._used)
+        return True
+
+    def _write_slot(self, slot, record):
+        """Replace a slot's record under its seqlock"""
+        mm = self._mm
+        seq = self._slot_seqs[slot]
+        slot_pos = HEADER_SIZE + slot * SLOT_SIZE
+        _SEQ.pack_into(mm, slot_pos, seq + 1)
+        mm[slot_pos + _SEQ.size:slot_pos + SLOT_SIZE] = record
+        _SEQ.pack_into(mm, slot_pos, seq + 2)
+        self._slot_seqs[slot] = seq + 2
+
+    def release(self, exchange, symbol):
+        """Drop a symbol's quote and free its slot for the next new symbol"""
+        with self._slot_lock:
+            slot = self._slots.pop((exchange, symbol), None)
+            if slot is None:
+                return
+            self._write_slot(slot, _EMPTY_RECORD)
+            self._free_slots.append(slot)
+            self._dropped.clear()  # a symbol turned away earlier may fit now
+
+    def clear(self):
+        """Forget all slots (readers see an empty table)"""
+        with self._slot_lock:
+            self._slots.clear()
+            self._free_slots.clear()
+            self._used = 0
+            self._dropped.clear()
+        _COUNT.pack_into(self._mm, _COUNT_OFFSET, 0)
+        self._generation += 1
+        _SEQ.pack_into(self._mm, 0, self._generation)
+
+    def close(self):
+        """Unmap the shared region"""
+        self._mm.close()
+
+
+def _decode(fields):
+    """PRICE_RECORD fields as a quote dict"""
+    return {
+        'symbol': fields[0].rstrip(b'\0').decode(),
+        'exchange': fields[1].rstrip(b'\0').decode(),
+        'ltp': fields[2],
+        'open': fields[3],
+        'high': fields[4],
+        'low': fields[5],
+        'close': fields[6],
+        'volume': fields[7],
+        'timestamp_ns': fields[8]
+    }
+
+
+def _open_readonly(path):
+    """Map the shared price file read-only, or None if it does not exist yet"""
+    try:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_shared_prices(path=SHARED_PRICES_PATH, retries=100):
+    """
+    Read the latest prices written by the WebSocket service
+
+    Args:
+        path: Shared price file
+        retries: Attempts per slot before skipping it when the writer keeps racing
+
+    Returns:
+        Dict of {"EXCHANGE:SYMBOL": {symbol, exchange, ltp, open, high, low,
+        close, volume, timestamp_ns}}, empty if the file does not exist
+    """
+    mm = _open_readonly(path)
+    if mm is None:
+        return {}
+
+    prices = {}
+    try:
+        _, capacity, count = HEADER.unpack_from(mm, 0)
+        for slot in range(min(count, capacity)):
+            pos = HEADER_SIZE + slot * SLOT_SIZE
+            for _ in range(retries):
+                seq = _SEQ.unpack_from(mm, pos)[0]
+                if not seq & 1:
+                    fields = PRICE_RECORD.unpack_from(mm, pos + _SEQ.size)
+                    if _SEQ.unpack_from(mm, pos)[0] == seq:
+                        break
+                # Writer is mid-update; yield so it can finish (it may be a
+                # thread in this process waiting on the GIL)
+                time.sleep(0)
+            else:
+                logger.warning(f"Shared price slot {slot} kept changing while reading")
+                continue
+
+            if not fields[0].strip(b'\0'):
+                continue  # released slot
+            quote = _decode(fields)
+            prices[f"{quote['exchange']}:{quote['symbol']}"] = quote
+    finally:
+        mm.close()
+    return prices
+
+
+def create_redis_client():
+    """
+    Redis connection for the price mirror
+
+    Returns:
+        redis.Redis, or None when REDIS_PRICE_PUBLISH is off, REDIS_URL is not
+        a Redis URL or the redis package is not installed
+    """
+    if not REDIS_PRICE_PUBLISH:
+        return None
+
+    redis_url = os.environ.get('REDIS_URL', '')
+    if not redis_url.startswith(('redis://', 'rediss://', 'unix://')):
+        logger.warning("REDIS_PRICE_PUBLISH is set but REDIS_URL is not a Redis URL, not mirroring prices")
+        return None
+
+    try:
+        import redis
+    except ImportError:
+        logger.warning("REDIS_PRICE_PUBLISH is set but the redis package is not installed, not mirroring prices")
+        return None
+
+    # Short timeouts: the service publishes on its flush thread ahead of risk
+    # checks, and the risk manager reads inside its check cycle
+    return redis.Redis.from_url(
+        redis_url, socket_keepalive=True, socket_timeout=1.0, socket_connect_timeout=1.0
+    )
+
+
+def read_redis_prices(client):
+    """
+    Read the latest prices the WebSocket service mirrors to Redis
+
+    Args:
+        client: Connection from create_redis_client()
+
+    Returns:
+        Dict in the read_shared_prices() format, empty if Redis is unreachable
+    """
+    try:
+        payloads = client.hgetall(REDIS_PRICES_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to read prices from Redis: {e}")
+        return {}
+    return {key.decode(): json.loads(payload) for key, payload in payloads.items()}
@@ -0,0 +1,104 @@
+"""
+Strategy dashboard aggregates
+
+SQL SUM/COUNT ... GROUP BY replacements for the Strategy P&L properties and
+strategy.legs.count(), shared by the main and strategy dashboards. Each
+helper returns a handful of rows instead of loading every execution or leg.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, case, and_, or_
+
+from app import db
+from app.models import StrategyExecution, StrategyLeg
+
+
+def _not_rejected():
+    """Broker status filter: rejected/cancelled orders never count toward P&L"""
+    return or_(
+        StrategyExecution.broker_order_status.is_(None),
+        StrategyExecution.broker_order_status.notin_(['rejected', 'cancelled'])
+    )
+
+
+def get_strategy_pnl(strategy_ids):
+    """
+    Per-strategy realized/unrealized P&L
+
+    Mirrors Strategy.realized_pnl/unrealized_pnl: error/failed executions
+    are skipped, while a NULL status still counts as it did in the Python
+    loop (NOT IN alone would drop it).
+
+    Returns:
+        Dict of strategy_id -> {'realized', 'unrealized', 'total'}; strategies
+        without executions are absent
+    """
+    if not strategy_ids:
+        return {}
+
+    pnl_filter = and_(
+        or_(
+            StrategyExecution.status.is_(None),
+            StrategyExecution.status.notin_(['error', 'failed'])
+        ),
+        _not_rejected()
+    )
+    pnl_rows = db.session.query(
+        StrategyExecution.strategy_id,
+        func.coalesce(func.sum(case(
+            (pnl_filter, StrategyExecution.realized_pnl),
+            else_=None
+        )), 0).label('realized'),
+        func.coalesce(func.sum(case(
+            (and_(pnl_filter, StrategyExecution.status == 'entered'),
+             StrategyExecution.unrealized_pnl),
+            else_=None
+        )), 0).label('unrealized')
+    ).filter(
+        StrategyExecution.strategy_id.in_(strategy_ids)
+    ).group_by(StrategyExecution.strategy_id).all()
+
+    strategy_pnl = {}
+    for row in pnl_rows:
+        realized = float(row.realized or 0)
+        unrealized = float(row.unrealized or 0)
+        strategy_pnl[row.strategy_id] = {
+            'realized': realized,
+            'unrealized': unrealized,
+            'total': realized + unrealized
+        }
+    return strategy_pnl
+
+
+def get_today_pnl(strategy_ids):
+    """Realized P&L of today's (UTC) successful executions across strategy_ids"""
+    if not strategy_ids:
+        return 0
+
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_pnl = db.session.query(
+        func.coalesce(func.sum(StrategyExecution.realized_pnl), 0)
+    ).filter(
+        StrategyExecution.strategy_id.in_(strategy_ids),
+        StrategyExecution.created_at >= today_start,
+        StrategyExecution.realized_pnl.isnot(None),
+        or_(
+            StrategyExecution.status.is_(None),
+            StrategyExecution.status != 'failed'
+        ),
+        _not_rejected()
+    ).scalar()
+    return float(today_pnl or 0)
+
+
+def get_leg_counts(strategy_ids):
+    """Leg count per strategy (replaces strategy.legs.count() per row)"""
+    if not strategy_ids:
+        return {}
+
+    return dict(db.session.query(
+        StrategyLeg.strategy_id,
+        func.count(StrategyLeg.id)
+    ).filter(
+        StrategyLeg.strategy_id.in_(strategy_ids)
+    ).group_by(StrategyLeg.strategy_id).all())
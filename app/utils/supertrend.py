@@ -1,23 +1,54 @@
 """
 Supertrend Indicator Module
-Uses OpenAlgo's ta.supertrend which matches TradingView/Pine Script exactly
+Pine Script Supertrend recurrence compiled with Numba (see _st_loop.py),
+matching OpenAlgo's ta.supertrend and TradingView exactly
 
 Direction convention (matching Pine Script/TradingView):
     - direction = -1: Bullish (Up direction, green) - price above supertrend
     - direction = 1: Bearish (Down direction, red) - price below supertrend
     - direction = 0/NaN: No signal (warmup period)
 """
+import os
+import threading
 import numpy as np
 import pandas as pd
 import logging
+from collections import namedtuple, OrderedDict
+
+# Imported eagerly so the kernel is compiled (or loaded from Numba's cache)
+# when the app starts, not inside the first request that needs it
+from app.utils._st_loop import _supertrend_loop
 
 logger = logging.getLogger(__name__)
 
+# Result cache for backtest parameter sweeps that re-evaluate the same OHLC
+# arrays. Opt-in via SUPERTREND_CACHE=1 so live paths always recompute.
+SUPERTREND_CACHE_ENABLED = os.environ.get('SUPERTREND_CACHE', '0') == '1'
+SUPERTREND_CACHE_SIZE = 128
+_supertrend_cache = OrderedDict()
+_supertrend_cache_lock = threading.Lock()
+
+# Per-bar state carried between incremental Supertrend updates
+SupertrendState = namedtuple('SupertrendState', [
+    'atr_prev', 'final_upper_prev', 'final_lower_prev',
+    'supertrend_prev', 'direction_prev', 'close_prev'
+])
+
+
+def _coerce(values):
+    """
+    Coerce a price series to a contiguous float64 numpy array
+
+    Float64 numpy input (or a Series backed by one) is returned without a copy.
+    """
+    values = values.values if hasattr(values, 'values') else values
+    return np.ascontiguousarray(values, dtype=np.float64)
+
 
 def calculate_supertrend(high, low, close, period=7, multiplier=3):
     """
-    Calculate Supertrend indicator using OpenAlgo's ta.supertrend
-    which matches TradingView/Pine Script exactly
+    Calculate Supertrend indicator using the Pine Script recurrence
+    compiled in app.utils._st_loop (matches TradingView exactly)
 
     Args:
         high: High price array (numpy array or pandas Series)
@@ -34,54 +65,60 @@ def calculate_supertrend(high, low, close, period=7, multiplier=3):
         - short: Short (resistance) line - visible when bearish
     """
     try:
-        from openalgo import ta
-
-        # Create DataFrame for easy calculation
-        df = pd.DataFrame({
-            'high': high,
-            'low': low,
-            'close': close
-        })
-
-        # Use OpenAlgo's ta.supertrend - matches TradingView exactly
-        df['supertrend'], df['direction'] = ta.supertrend(
-            df['high'], df['low'], df['close'],
-            period=period, multiplier=multiplier
+        high = _coerce(high)
+        low = _coerce(low)
+        close = _coerce(close)
+
+        n = len(close)
+
+        cache_key = None
+        if SUPERTREND_CACHE_ENABLED:
+            cache_key = (hash(high.tobytes()), hash(low.tobytes()), hash(close.tobytes()),
+                         n, period, float(multiplier))
+            with _supertrend_cache_lock:
+                cached = _supertrend_cache.get(cache_key)
+                if cached is not None:
+                    _supertrend_cache.move_to_end(cache_key)
+                    return cached
+
+        # Fewer bars than the ATR period has no valid ATR: bail out before the
+        # kernel allocates anything. One NaN array is shared by the read-only outputs.
+        if n < period:
+            nan_array = np.full(n, np.nan)
+            return nan_array, np.zeros(n, dtype=np.int32), nan_array, nan_array
+
+        # ATR and the band/direction recurrence run in one compiled pass
+        trend, direction_raw, final_upper, final_lower, _ = _supertrend_loop(
+            high, low, close, int(period), float(multiplier)
         )
 
-        # Convert to numpy arrays
-        trend = df['supertrend'].values
-        direction_raw = df['direction'].values
+        # NaN in the ATR seed window leaves no valid ATR either
+        if not np.isfinite(trend[period - 1]):
+            nan_array = np.full(n, np.nan)
+            return nan_array, np.zeros(n, dtype=np.int32), nan_array, nan_array
+
+        # Long line follows the lower band when bullish, short the upper band otherwise
+        bullish = direction_raw == -1.0
+        long = np.where(bullish, final_lower, np.nan)
+        short = np.where(bullish, np.nan, final_upper)
 
         # Convert direction: NaN -> 0, keep -1 and 1
-        direction = np.zeros(len(direction_raw), dtype=np.int32)
-        for i in range(len(direction_raw)):
-            if pd.isna(direction_raw[i]):
-                direction[i] = 0  # No signal (warmup)
-            else:
-                direction[i] = int(direction_raw[i])
-
-        # Create long/short arrays for compatibility
-        n = len(trend)
-        long = np.full(n, np.nan)
-        short = np.full(n, np.nan)
-
-        for i in range(n):
-            if not np.isnan(trend[i]):
-                if direction[i] == -1:  # Bullish
-                    long[i] = trend[i]
-                elif direction[i] == 1:  # Bearish
-                    short[i] = trend[i]
-
-        logger.debug(f"Supertrend calculated using OpenAlgo ta: period={period}, multiplier={multiplier}")
+        direction = np.nan_to_num(direction_raw, nan=0.0).astype(np.int32)
+
+        logger.debug(f"Supertrend calculated: period={period}, multiplier={multiplier}")
+
+        if cache_key is not None:
+            result = (trend, direction, long, short)
+            # Cached arrays are shared between callers, so make them read-only
+            for arr in result:
+                arr.setflags(write=False)
+            with _supertrend_cache_lock:
+                _supertrend_cache[cache_key] = result
+                if len(_supertrend_cache) > SUPERTREND_CACHE_SIZE:
+                    _supertrend_cache.popitem(last=False)
 
         return trend, direction, long, short
 
-    except ImportError:
-        logger.error("OpenAlgo library not installed. Please install with: pip install openalgo")
-        n = len(close)
-        nan_array = np.full(n, np.nan)
-        return nan_array, np.zeros(n, dtype=np.int32), nan_array, nan_array
     except Exception as e:
         logger.error(f"Error calculating Supertrend: {e}", exc_info=True)
         n = len(close) if hasattr(close, '__len__') else 0
@@ -89,6 +126,111 @@ def calculate_supertrend(high, low, close, period=7, multiplier=3):
         return nan_array, np.zeros(n, dtype=np.int32), nan_array, nan_array
 
 
+def init_supertrend_state(high, low, close, period=7, multiplier=3):
+    """
+    Bootstrap incremental Supertrend state from a full calculation
+
+    Args:
+        high: High price array (numpy array or pandas Series)
+        low: Low price array (numpy array or pandas Series)
+        close: Close price array (numpy array or pandas Series)
+        period: ATR period (default: 7)
+        multiplier: ATR multiplier/factor (default: 3)
+
+    Returns:
+        SupertrendState for the last bar, or None if there is not enough data
+    """
+    try:
+        high = _coerce(high)
+        low = _coerce(low)
+        close = _coerce(close)
+
+        if len(close) < period:
+            return None
+
+        trend, direction, final_upper, final_lower, last_atr = _supertrend_loop(
+            high, low, close, int(period), float(multiplier)
+        )
+        if not np.isfinite(last_atr):
+            return None
+
+        return SupertrendState(
+            atr_prev=float(last_atr),
+            final_upper_prev=float(final_upper[-1]),
+            final_lower_prev=float(final_lower[-1]),
+            supertrend_prev=float(trend[-1]),
+            direction_prev=int(direction[-1]),
+            close_prev=float(close[-1])
+        )
+
+    except Exception as e:
+        logger.error(f"Error initializing Supertrend state: {e}", exc_info=True)
+        return None
+
+
+def calculate_supertrend_incremental(state, new_high, new_low, new_close, period=7, multiplier=3):
+    """
+    Advance Supertrend by one bar in O(1) using the carried state
+
+    Applies the same Wilder ATR and Pine Script band/direction rules as
+    calculate_supertrend, using scalars only, so live callers do not need
+    to recompute the whole series for every new bar.
+
+    Args:
+        state: SupertrendState from init_supertrend_state or a previous update
+        new_high: High of the new bar
+        new_low: Low of the new bar
+        new_close: Close of the new bar
+        period: ATR period (must match the bootstrap call)
+        multiplier: ATR multiplier/factor (must match the bootstrap call)
+
+    Returns:
+        Tuple of (new_state, signal) where signal is 'BUY' or 'SELL'
+    """
+    prev_close = state.close_prev
+
+    # Wilder-smoothed ATR
+    tr = max(new_high - new_low, abs(new_high - prev_close), abs(new_low - prev_close))
+    atr = (state.atr_prev * (period - 1) + tr) / period
+
+    hl_avg = (new_high + new_low) / 2.0
+    upper_band = hl_avg + multiplier * atr
+    lower_band = hl_avg - multiplier * atr
+
+    prev_fu = state.final_upper_prev
+    prev_fl = state.final_lower_prev
+
+    if lower_band > prev_fl or prev_close < prev_fl:
+        final_lower = lower_band
+    else:
+        final_lower = prev_fl
+
+    if upper_band < prev_fu or prev_close > prev_fu:
+        final_upper = upper_band
+    else:
+        final_upper = prev_fu
+
+    if state.direction_prev == 1:
+        # Previous bar was on the upper band (downtrend)
+        direction = -1 if new_close > final_upper else 1
+    else:
+        # Previous bar was on the lower band (uptrend)
+        direction = 1 if new_close < final_lower else -1
+
+    supertrend = final_lower if direction == -1 else final_upper
+
+    new_state = SupertrendState(
+        atr_prev=atr,
+        final_upper_prev=final_upper,
+        final_lower_prev=final_lower,
+        supertrend_prev=supertrend,
+        direction_prev=direction,
+        close_prev=float(new_close)
+    )
+
+    return new_state, get_supertrend_signal([direction])
+
+
 def get_supertrend_signal(direction):
     """
     Get current Supertrend signal
@@ -136,51 +278,30 @@ def calculate_spread_supertrend(leg_prices_dict, high_col='high', low_col='low',
         Dict with spread OHLC and Supertrend data
     """
     try:
-        from openalgo import ta
-
         if not leg_prices_dict:
             logger.error("No leg prices provided")
             return None
 
-        # Calculate combined spread
-        combined_high = None
-        combined_low = None
-        combined_close = None
-
-        for leg_name, df in leg_prices_dict.items():
-            if combined_close is None:
-                combined_high = df[high_col].copy()
-                combined_low = df[low_col].copy()
-                combined_close = df[close_col].copy()
-            else:
-                combined_high += df[high_col]
-                combined_low += df[low_col]
-                combined_close += df[close_col]
-
-        # Create spread DataFrame
-        spread_df = pd.DataFrame({
-            'high': combined_high,
-            'low': combined_low,
-            'close': combined_close
-        })
-
-        # Calculate Supertrend using OpenAlgo
-        spread_df['supertrend'], spread_df['direction'] = ta.supertrend(
-            spread_df['high'], spread_df['low'], spread_df['close'],
+        # Calculate combined spread (legs share the same bar index)
+        dfs = list(leg_prices_dict.values())
+        index = dfs[0].index
+        combined_high = np.sum(np.stack([df[high_col].to_numpy(dtype=np.float64) for df in dfs]), axis=0)
+        combined_low = np.sum(np.stack([df[low_col].to_numpy(dtype=np.float64) for df in dfs]), axis=0)
+        combined_close = np.sum(np.stack([df[close_col].to_numpy(dtype=np.float64) for df in dfs]), axis=0)
+
+        trend, direction, long, short = calculate_supertrend(
+            combined_high, combined_low, combined_close,
             period=period, multiplier=multiplier
         )
 
-        # Convert direction NaN to 0
-        direction = spread_df['direction'].fillna(0).astype(int).values
-
         return {
-            'high': combined_high,
-            'low': combined_low,
-            'close': combined_close,
-            'supertrend': spread_df['supertrend'].values,
+            'high': pd.Series(combined_high, index=index),
+            'low': pd.Series(combined_low, index=index),
+            'close': pd.Series(combined_close, index=index),
+            'supertrend': trend,
             'direction': direction,
-            'long': np.where(direction == -1, spread_df['supertrend'].values, np.nan),
-            'short': np.where(direction == 1, spread_df['supertrend'].values, np.nan),
+            'long': long,
+            'short': short,
             'signal': get_supertrend_signal(direction)
         }
 
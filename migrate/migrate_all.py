@@ -9,95 +9,113 @@ Usage:
 
 import os
 import sys
+import inspect
 import importlib.util
 
 # Add parent directory to path for app imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app, db
-from sqlalchemy import text
+from sqlalchemy import text, inspect as sa_inspect
+
+
+def get_applied_migrations():
+    """Get set of already applied migrations from database (requires app context)"""
+    # Detect database type for compatible DDL
+    db_uri = str(db.engine.url)
+    is_postgres = 'postgresql' in db_uri
+
+    # Create table if it doesn't exist (database-agnostic syntax)
+    if is_postgres:
+        create_sql = """
+            CREATE TABLE IF NOT EXISTS applied_migrations (
+                id SERIAL PRIMARY KEY,
+                migration_name VARCHAR(255) NOT NULL UNIQUE,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+    else:
+        create_sql = """
+            CREATE TABLE IF NOT EXISTS applied_migrations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                migration_name VARCHAR(255) NOT NULL UNIQUE,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+
+    db.session.execute(text(create_sql))
+    db.session.commit()
+
+    try:
+        result = db.session.execute(text(
+            "SELECT migration_name FROM applied_migrations ORDER BY applied_at"
+        ))
+        applied = [row[0] for row in result.fetchall()]
+    except Exception:
+        applied = []
+
+    # On PostgreSQL with empty tracking table, seed all SQLite-era migrations
+    # as already applied (they ran on SQLite before the PostgreSQL migration)
+    if is_postgres and not applied:
+        sqlite_migrations = [
+            '001_add_next_month_lot_size',
+            '002_add_product_to_strategy_executions',
+            '003_add_trailing_sl_tracking',
+            '004_add_supertrend_exit_reason',
+            '005_add_risk_exit_reasons',
+            '006_add_trailing_sl_initial_stop',
+            '007_add_margin_source_to_trade_qualities',
+            '008_add_option_buying_premium',
+            '009_add_performance_indexes',
+            '010_add_2026_holidays',
+            '011_update_nifty_banknifty_lot_sizes',
+        ]
+        for mig in sqlite_migrations:
+            db.session.execute(
+                text("INSERT INTO applied_migrations (migration_name) VALUES (:name) ON CONFLICT DO NOTHING"),
+                {"name": mig}
+            )
+        db.session.commit()
+        print(f"Seeded {len(sqlite_migrations)} pre-existing migrations (SQLite era)")
+        applied = sqlite_migrations
 
+    return set(applied)
 
-def get_applied_migrations(app):
-    """Get list of already applied migrations from database"""
-    with app.app_context():
-        # Detect database type for compatible DDL
-        db_uri = str(db.engine.url)
-        is_postgres = 'postgresql' in db_uri
-
-        # Create table if it doesn't exist (database-agnostic syntax)
-        if is_postgres:
-            create_sql = """
-                CREATE TABLE IF NOT EXISTS applied_migrations (
-                    id SERIAL PRIMARY KEY,
-                    migration_name VARCHAR(255) NOT NULL UNIQUE,
-                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-        else:
-            create_sql = """
-                CREATE TABLE IF NOT EXISTS applied_migrations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    migration_name VARCHAR(255) NOT NULL UNIQUE,
-                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-
-        db.session.execute(text(create_sql))
-        db.session.commit()
 
-        try:
-            result = db.session.execute(text(
-                "SELECT migration_name FROM applied_migrations ORDER BY applied_at"
-            ))
-            applied = [row[0] for row in result.fetchall()]
-        except Exception:
-            applied = []
-
-        # On PostgreSQL with empty tracking table, seed all SQLite-era migrations
-        # as already applied (they ran on SQLite before the PostgreSQL migration)
-        if is_postgres and not applied:
-            sqlite_migrations = [
-                '001_add_next_month_lot_size',
-                '002_add_product_to_strategy_executions',
-                '003_add_trailing_sl_tracking',
-                '004_add_supertrend_exit_reason',
-                '005_add_risk_exit_reasons',
-                '006_add_trailing_sl_initial_stop',
-                '007_add_margin_source_to_trade_qualities',
-                '008_add_option_buying_premium',
-                '009_add_performance_indexes',
-                '010_add_2026_holidays',
-                '011_update_nifty_banknifty_lot_sizes',
-            ]
-            for mig in sqlite_migrations:
-                db.session.execute(
-                    text("INSERT INTO applied_migrations (migration_name) VALUES (:name) ON CONFLICT DO NOTHING"),
-                    {"name": mig}
-                )
-            db.session.commit()
-            print(f"Seeded {len(sqlite_migrations)} pre-existing migrations (SQLite era)")
-            applied = sqlite_migrations
-
-        return applied
-
-
-def mark_migration_applied(app, migration_name):
-    """Mark a migration as applied"""
-    with app.app_context():
-        db.session.execute(
-            text("INSERT INTO applied_migrations (migration_name) VALUES (:name)"),
-            {"name": migration_name}
-        )
-        db.session.commit()
+def get_existing_columns():
+    """Map each table to its set of column names in one inspector sweep
+    (requires app context). Migrations update the sets as they add columns."""
+    inspector = sa_inspect(db.engine)
+    return {
+        table: {column['name'] for column in inspector.get_columns(table)}
+        for table in inspector.get_table_names()
+    }
+
+
+def mark_migrations_applied(migration_names):
+    """Mark migrations as applied in one executemany and commit (requires app context)"""
+    if not migration_names:
+        return
+    db.session.execute(
+        text("INSERT INTO applied_migrations (migration_name) VALUES (:name)"),
+        [{"name": name} for name in migration_names]
+    )
+    db.session.commit()
 
 
 def run_migrations():
     """Run all pending migrations"""
     app = create_app()
 
+    # Single app context for the whole run instead of one per migration
+    with app.app_context():
+        return _run_pending_migrations()
+
+
+def _run_pending_migrations():
+    """Run pending migrations inside an active app context"""
     # Get already applied migrations
-    applied = get_applied_migrations(app)
+    applied = get_applied_migrations()
     print(f"Already applied migrations: {len(applied)}")
 
     # Get all migration files from upgrade folder
@@ -107,7 +125,10 @@ def run_migrations():
         if f.endswith('.py') and not f.startswith('__')
     ])
 
-    pending_count = 0
+    # Recorded together after the loop: one tracking commit instead of one per
+    # migration (upgrades are idempotent, so an interrupted run is safe to repeat)
+    newly_applied = []
+    existing_columns = None
     for migration_file in migration_files:
         migration_name = migration_file[:-3]  # Remove .py extension
 
@@ -127,23 +148,32 @@ def run_migrations():
         try:
             spec.loader.exec_module(module)
 
-            # Run the upgrade function
-            with app.app_context():
+            # Run the upgrade function, sharing the column map with
+            # migrations that accept it instead of each re-reading the schema
+            if 'existing_columns' in inspect.signature(module.upgrade).parameters:
+                if existing_columns is None:
+                    existing_columns = get_existing_columns()
+                module.upgrade(db, existing_columns=existing_columns)
+            else:
                 module.upgrade(db)
 
-            # Mark as applied
-            mark_migration_applied(app, migration_name)
+            newly_applied.append(migration_name)
+            applied.add(migration_name)
             print("OK")
-            pending_count += 1
 
         except Exception as e:
             print(f"FAILED: {e}")
+            # Keep the migrations that did succeed recorded
+            db.session.rollback()
+            mark_migrations_applied(newly_applied)
             return False
 
-    if pending_count == 0:
+    mark_migrations_applied(newly_applied)
+
+    if not newly_applied:
         print("\nNo pending migrations.")
     else:
-        print(f"\nApplied {pending_count} migration(s) successfully.")
+        print(f"\nApplied {len(newly_applied)} migration(s) successfully.")
 
     return True
 
@@ -8,17 +8,22 @@ from current month due to NSE circular changes (effective Jan 2025).
 from sqlalchemy import text
 
 
-def upgrade(db):
+def upgrade(db, existing_columns=None):
     """Add next_month_lot_size column to trading_settings table"""
 
     # Check if column already exists
-    result = db.session.execute(text("PRAGMA table_info(trading_settings)"))
-    columns = [row[1] for row in result.fetchall()]
+    if existing_columns is not None:
+        # Column map shared by migrate_all.py (one lookup per table per run)
+        columns = existing_columns.setdefault('trading_settings', set())
+    else:
+        result = db.session.execute(text("PRAGMA table_info(trading_settings)"))
+        columns = {row[1] for row in result.fetchall()}
 
     if 'next_month_lot_size' not in columns:
         db.session.execute(text(
             "ALTER TABLE trading_settings ADD COLUMN next_month_lot_size INTEGER"
         ))
+        columns.add('next_month_lot_size')
         db.session.commit()
         print("Added next_month_lot_size column")
     else:
@@ -9,18 +9,22 @@ instead of the actual broker product type.
 from sqlalchemy import text
 
 
-def upgrade(db):
+def upgrade(db, existing_columns=None):
     """Add product column to strategy_executions table"""
 
     # Check if column already exists
-    result = db.session.execute(text("PRAGMA table_info(strategy_executions)"))
-    columns = [row[1] for row in result.fetchall()]
+    if existing_columns is not None:
+        # Column map shared by migrate_all.py (one lookup per table per run)
+        columns = existing_columns.setdefault('strategy_executions', set())
+    else:
+        result = db.session.execute(text("PRAGMA table_info(strategy_executions)"))
+        columns = {row[1] for row in result.fetchall()}
 
     if 'product' not in columns:
         db.session.execute(text(
             "ALTER TABLE strategy_executions ADD COLUMN product VARCHAR(10)"
         ))
-        db.session.commit()
+        columns.add('product')
         print("Added product column to strategy_executions")
 
         # Backfill existing executions with product from their strategy's product_order_type
@@ -34,6 +38,7 @@ def upgrade(db):
             )
             WHERE product IS NULL
         """))
+        # Single commit for the ALTER and the backfill
         db.session.commit()
         print("Backfilled product values from strategy.product_order_type")
     else:
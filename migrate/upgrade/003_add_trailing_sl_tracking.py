@@ -11,12 +11,16 @@ These columns track the real-time state of trailing stop loss:
 from sqlalchemy import text
 
 
-def upgrade(db):
+def upgrade(db, existing_columns=None):
     """Add trailing SL tracking columns to strategies table"""
 
     # Check existing columns
-    result = db.session.execute(text("PRAGMA table_info(strategies)"))
-    columns = [row[1] for row in result.fetchall()]
+    if existing_columns is not None:
+        # Column map shared by migrate_all.py (one lookup per table per run)
+        columns = existing_columns.setdefault('strategies', set())
+    else:
+        result = db.session.execute(text("PRAGMA table_info(strategies)"))
+        columns = {row[1] for row in result.fetchall()}
 
     # Columns to add with their SQL definitions
     columns_to_add = [
@@ -32,6 +36,7 @@ def upgrade(db):
             db.session.execute(text(
                 f"ALTER TABLE strategies ADD COLUMN {col_name} {col_type}"
             ))
+            columns.add(col_name)
             print(f"  Added column: {col_name}")
             added_count += 1
         else:
@@ -10,17 +10,22 @@ Part of the AFL-style ratcheting trailing stop implementation:
 from sqlalchemy import text
 
 
-def upgrade(db):
+def upgrade(db, existing_columns=None):
     """Add trailing_sl_initial_stop column to strategies table"""
 
     # Check existing columns
-    result = db.session.execute(text("PRAGMA table_info(strategies)"))
-    columns = [row[1] for row in result.fetchall()]
+    if existing_columns is not None:
+        # Column map shared by migrate_all.py (one lookup per table per run)
+        columns = existing_columns.setdefault('strategies', set())
+    else:
+        result = db.session.execute(text("PRAGMA table_info(strategies)"))
+        columns = {row[1] for row in result.fetchall()}
 
     if 'trailing_sl_initial_stop' not in columns:
         db.session.execute(text(
             "ALTER TABLE strategies ADD COLUMN trailing_sl_initial_stop FLOAT"
         ))
+        columns.add('trailing_sl_initial_stop')
         print("  Added column: trailing_sl_initial_stop")
         db.session.commit()
     else:
@@ -11,17 +11,22 @@ Option buyers use a percentage of cash margin to calculate premium budget.
 from sqlalchemy import text
 
 
-def upgrade(db):
+def upgrade(db, existing_columns=None):
     """Add margin_source column to trade_qualities table"""
 
     # Check existing columns
-    result = db.session.execute(text("PRAGMA table_info(trade_qualities)"))
-    columns = [row[1] for row in result.fetchall()]
+    if existing_columns is not None:
+        # Column map shared by migrate_all.py (one lookup per table per run)
+        columns = existing_columns.setdefault('trade_qualities', set())
+    else:
+        result = db.session.execute(text("PRAGMA table_info(trade_qualities)"))
+        columns = {row[1] for row in result.fetchall()}
 
     if 'margin_source' not in columns:
         db.session.execute(text(
             "ALTER TABLE trade_qualities ADD COLUMN margin_source VARCHAR(20) DEFAULT 'available'"
         ))
+        columns.add('margin_source')
         print("  Added column: margin_source (default='available')")
         db.session.commit()
     else:
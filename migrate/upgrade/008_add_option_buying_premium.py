@@ -8,19 +8,23 @@ Used to calculate lot size based on cash margin for option buyers.
 from sqlalchemy import text
 
 
-def upgrade(db):
+def upgrade(db, existing_columns=None):
     """Add option_buying_premium columns to margin_requirements table"""
 
     # Check existing columns
-    result = db.session.execute(text("PRAGMA table_info(margin_requirements)"))
-    columns = [row[1] for row in result.fetchall()]
+    if existing_columns is not None:
+        # Column map shared by migrate_all.py (one lookup per table per run)
+        columns = existing_columns.setdefault('margin_requirements', set())
+    else:
+        result = db.session.execute(text("PRAGMA table_info(margin_requirements)"))
+        columns = {row[1] for row in result.fetchall()}
 
     if 'option_buying_premium' not in columns:
         db.session.execute(text(
             "ALTER TABLE margin_requirements ADD COLUMN option_buying_premium FLOAT DEFAULT 20000"
         ))
+        columns.add('option_buying_premium')
         print("  Added column: option_buying_premium (default=20000)")
-        db.session.commit()
     else:
         print("  Column option_buying_premium already exists, skipping")
 
@@ -28,11 +32,14 @@ def upgrade(db):
         db.session.execute(text(
             "ALTER TABLE margin_requirements ADD COLUMN sensex_option_buying_premium FLOAT DEFAULT 20000"
         ))
+        columns.add('sensex_option_buying_premium')
         print("  Added column: sensex_option_buying_premium (default=20000)")
-        db.session.commit()
     else:
         print("  Column sensex_option_buying_premium already exists, skipping")
 
+    # Single commit for both ALTERs
+    db.session.commit()
+
 
 def downgrade(db):
     """Remove option_buying_premium columns (SQLite doesn't support DROP COLUMN easily)"""
@@ -0,0 +1,50 @@
+"""
+Migration: Add composite index for day-bounded execution queries
+
+The dashboards sum today's P&L with strategy_id IN (...) AND
+created_at >= today_start. The composite (strategy_id, created_at) index
+turns this into a range scan per strategy instead of reading every
+execution of the user's strategies.
+
+ix_strategies_user_active (user_id, is_active) already exists from
+migrations 009/012, so it is not recreated here.
+"""
+
+from sqlalchemy import text, inspect as sa_inspect
+
+
+def upgrade(db):
+    """Add execution indexes (database-agnostic using IF NOT EXISTS)"""
+
+    indexes = [
+        ('ix_strategy_executions_strategy_created',
+         'CREATE INDEX IF NOT EXISTS ix_strategy_executions_strategy_created ON strategy_executions(strategy_id, created_at)'),
+    ]
+
+    # IF NOT EXISTS is silent when the index is already there, so check
+    # first to report what was actually created
+    existing = {index['name'] for index in sa_inspect(db.engine).get_indexes('strategy_executions')}
+
+    created_count = 0
+    skipped_count = 0
+
+    for index_name, create_sql in indexes:
+        if index_name in existing:
+            print(f"  Index {index_name} already exists, skipping")
+            skipped_count += 1
+            continue
+        try:
+            db.session.execute(text(create_sql))
+            print(f"  Created index {index_name}")
+            created_count += 1
+        except Exception as e:
+            print(f"  Failed to create {index_name}: {e}")
+
+    db.session.commit()
+    print(f"\nIndexes: {created_count} created, {skipped_count} already existed")
+
+
+def downgrade(db):
+    """Remove execution indexes"""
+    db.session.execute(text("DROP INDEX IF EXISTS ix_strategy_executions_strategy_created"))
+    db.session.commit()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+Test script to verify the shared-memory price table written by websocket_service
+"""
+
+import sys
+import os
+import json
+import math
+import logging
+import tempfile
+import subprocess
+from unittest import mock
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.utils import shared_prices
+from app.utils.shared_prices import (
+    SharedPriceWriter, read_shared_prices, read_redis_prices, create_redis_client
+)
+
+
+class _ListHandler(logging.Handler):
+    """Collects log records for assertions"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_write_and_read():
+    """Written quotes are visible to a reader, latest write wins per symbol"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prices.mmap')
+        writer = SharedPriceWriter(path, max_symbols=4)
+
+        writer.write('NFO', 'NIFTY25DEC24000CE', 101.5, 100, 102, 99, 100.5, 1500, 1)
+        writer.write('NSE', 'INFY', 1605.8, timestamp_ns=2)
+        writer.write('NFO', 'NIFTY25DEC24000CE', 103.25, 100, 104, 99, 100.5, 1800, 3)
+
+        prices = read_shared_prices(path)
+        assert set(prices) == {'NFO:NIFTY25DEC24000CE', 'NSE:INFY'}
+
+        option = prices['NFO:NIFTY25DEC24000CE']
+        assert option['ltp'] == 103.25
+        assert option['high'] == 104
+        assert option['volume'] == 1800
+        assert option['timestamp_ns'] == 3
+
+        # Missing OHLC fields are stored as NaN
+        assert math.isnan(prices['NSE:INFY']['open'])
+
+        writer.close()
+
+
+def test_read_from_another_process():
+    """A separate process maps the file and sees the writer's quotes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prices.mmap')
+        writer = SharedPriceWriter(path, max_symbols=4)
+        writer.write('NFO', 'NIFTY25DEC24000CE', 101.5, volume=1500, timestamp_ns=7)
+
+        script = ("import json, sys; from app.utils.shared_prices import read_shared_prices; "
+                  "print(json.dumps(read_shared_prices(sys.argv[1])))")
+        output = subprocess.run([sys.executable, '-c', script, path], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        quote = json.loads(output)['NFO:NIFTY25DEC24000CE']
+        assert quote['ltp'] == 101.5
+        assert quote['volume'] == 1500
+        assert quote['timestamp_ns'] == 7
+
+        writer.close()
+
+
+def test_capacity_and_clear():
+    """Writes beyond capacity are dropped and logged once; clear empties the table"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prices.mmap')
+        writer = SharedPriceWriter(path, max_symbols=2)
+        handler = _ListHandler()
+        shared_prices.logger.addHandler(handler)
+
+        try:
+            assert writer.write('NSE', 'A', 1.0)
+            assert writer.write('NSE', 'B', 2.0)
+            assert not writer.write('NSE', 'C', 3.0)
+            assert not writer.write('NSE', 'C', 3.1)
+        finally:
+            shared_prices.logger.removeHandler(handler)
+        assert [r.levelno for r in handler.records] == [logging.WARNING]
+        assert 'NSE:C' in handler.records[0].getMessage()
+
+        assert writer.write('NSE', 'A', 1.5)
+        assert set(read_shared_prices(path)) == {'NSE:A', 'NSE:B'}
+
+        writer.clear()
+        assert read_shared_prices(path) == {}
+
+        writer.write('NSE', 'C', 3.0)
+        assert read_shared_prices(path)['NSE:C']['ltp'] == 3.0
+
+        writer.close()
+
+
+def test_release_reuses_slot():
+    """A released symbol disappears for readers and its slot goes to the next new symbol"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prices.mmap')
+        writer = SharedPriceWriter(path, max_symbols=2)
+
+        writer.write('NSE', 'A', 1.0)
+        writer.write('NSE', 'B', 2.0)
+        writer.release('NSE', 'A')
+        writer.release('NSE', 'UNKNOWN')
+        assert set(read_shared_prices(path)) == {'NSE:B'}
+
+        assert writer.write('NSE', 'C', 3.0)
+        prices = read_shared_prices(path)
+        assert set(prices) == {'NSE:B', 'NSE:C'}
+        assert prices['NSE:C']['ltp'] == 3.0
+
+        # Table is full again
+        assert not writer.write('NSE', 'D', 4.0)
+
+        writer.close()
+
+
+def test_reader_retries_torn_slot():
+    """A slot caught mid-write is re-read once settled; one that never settles is skipped"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prices.mmap')
+        writer = SharedPriceWriter(path, max_symbols=2)
+        writer.write('NSE', 'A', 1.0)
+        writer.write('NSE', 'B', 2.0)
+
+        # Odd seq: the writer is in the middle of updating slot 0
+        seq_pos = shared_prices.HEADER_SIZE
+        seq = writer._slot_seqs[0]
+        shared_prices._SEQ.pack_into(writer._mm, seq_pos, seq + 1)
+
+        # The reader yields while it waits; let the write finish there
+        def finish_write(_):
+            writer.write('NSE', 'A', 1.5)
+
+        with mock.patch.object(shared_prices.time, 'sleep', side_effect=finish_write) as sleep:
+            prices = read_shared_prices(path)
+        assert sleep.call_count == 1
+        assert prices['NSE:A']['ltp'] == 1.5
+        assert prices['NSE:B']['ltp'] == 2.0
+
+        # A writer that never finishes costs only that slot
+        shared_prices._SEQ.pack_into(writer._mm, seq_pos, writer._slot_seqs[0] + 1)
+        with mock.patch.object(shared_prices.time, 'sleep') as sleep:
+            prices = read_shared_prices(path, retries=3)
+        assert sleep.call_count == 3
+        assert set(prices) == {'NSE:B'}
+
+        writer.close()
+
+
+def test_missing_file():
+    """Reader returns nothing before the service has started"""
+    assert read_shared_prices('/nonexistent/prices.mmap') == {}
+
+
+def test_redis_client_gating():
+    """No Redis client unless enabled, pointed at a Redis URL and installed"""
+    with mock.patch.object(shared_prices, 'REDIS_PRICE_PUBLISH', False), \
+            mock.patch.dict(os.environ, {'REDIS_URL': 'redis://127.0.0.1:6379/0'}):
+        assert create_redis_client() is None
+
+    with mock.patch.object(shared_prices, 'REDIS_PRICE_PUBLISH', True):
+        with mock.patch.dict(os.environ, {'REDIS_URL': ''}):
+            assert create_redis_client() is None
+        with mock.patch.dict(os.environ, {'REDIS_URL': 'memory://'}):
+            assert create_redis_client() is None
+        with mock.patch.dict(os.environ, {'REDIS_URL': 'redis://127.0.0.1:6379/0'}), \
+                mock.patch.dict(sys.modules, {'redis': None}):
+            assert create_redis_client() is None
+
+
+def test_read_redis_prices():
+    """The Redis mirror decodes to the table's format; an unreachable Redis reads as empty"""
+    payload = json.dumps({'symbol': 'INFY', 'exchange': 'NSE', 'ltp': 1605.8, 'timestamp_ns': 5})
+    client = mock.Mock()
+    client.hgetall.return_value = {b'NSE:INFY': payload.encode()}
+    prices = read_redis_prices(client)
+    client.hgetall.assert_called_once_with(shared_prices.REDIS_PRICES_KEY)
+    assert prices == {'NSE:INFY': {'symbol': 'INFY', 'exchange': 'NSE', 'ltp': 1605.8, 'timestamp_ns': 5}}
+
+    client.hgetall.side_effect = ConnectionError('refused')
+    assert read_redis_prices(client) == {}
+
+
+if __name__ == '__main__':
+    test_write_and_read()
+    test_read_from_another_process()
+    test_capacity_and_clear()
+    test_release_reuses_slot()
+    test_reader_retries_torn_slot()
+    test_missing_file()
+    test_redis_client_gating()
+    test_read_redis_prices()
+    print("All shared price tests passed")
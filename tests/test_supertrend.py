@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Test script to verify the compiled Supertrend matches OpenAlgo's ta.supertrend
+"""
+
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openalgo import ta
+from app.utils.supertrend import (
+    calculate_supertrend, calculate_spread_supertrend,
+    init_supertrend_state, calculate_supertrend_incremental
+)
+
+
+def _random_ohlc(n, seed=42):
+    """Generate a random-walk OHLC series"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    high = close + rng.uniform(0, 2, n)
+    low = close - rng.uniform(0, 2, n)
+    return high, low, close
+
+
+def test_matches_openalgo():
+    """Compiled Supertrend must match OpenAlgo's ta.supertrend bar for bar"""
+    high, low, close = _random_ohlc(500)
+
+    for period, multiplier in [(7, 3), (10, 2.5), (14, 1)]:
+        trend, direction, long, short = calculate_supertrend(
+            high, low, close, period=period, multiplier=multiplier
+        )
+        expected_trend, expected_dir = ta.supertrend(high, low, close, period=period, multiplier=multiplier)
+
+        np.testing.assert_allclose(trend, expected_trend, equal_nan=True)
+        np.testing.assert_array_equal(direction, np.nan_to_num(expected_dir, nan=0).astype(np.int32))
+        np.testing.assert_allclose(long, np.where(direction == -1, trend, np.nan), equal_nan=True)
+        np.testing.assert_allclose(short, np.where(direction == 1, trend, np.nan), equal_nan=True)
+
+
+def test_nan_input_matches_openalgo():
+    """A NaN high or low ends the signal like ta.supertrend instead of freezing the band"""
+    for column in (0, 1):
+        for bar in (5, 50, 120):
+            ohlc = list(_random_ohlc(300))
+            ohlc[column][bar] = np.nan
+            trend, direction, _, _ = calculate_supertrend(*ohlc, period=10, multiplier=3)
+            expected_trend, _ = ta.supertrend(*ohlc, period=10, multiplier=3)
+
+            # The NaN bar itself is left undefined by OpenAlgo, so compare around it
+            np.testing.assert_allclose(trend[:bar], expected_trend[:bar], equal_nan=True)
+            np.testing.assert_allclose(trend[bar + 1:], expected_trend[bar + 1:], equal_nan=True)
+            assert np.isnan(trend[bar:]).all()
+            assert (direction[bar:] == 0).all()
+
+
+def test_series_input():
+    """pandas Series input gives the same result as numpy input"""
+    high, low, close = _random_ohlc(200, seed=7)
+    from_arrays = calculate_supertrend(high, low, close)
+    from_series = calculate_supertrend(pd.Series(high), pd.Series(low), pd.Series(close))
+
+    for a, b in zip(from_arrays, from_series):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_insufficient_data():
+    """Series shorter than the ATR period yields no signal"""
+    high, low, close = _random_ohlc(5)
+    trend, direction, long, short = calculate_supertrend(high, low, close, period=7)
+
+    assert np.isnan(trend).all()
+    assert (direction == 0).all()
+    assert np.isnan(long).all() and np.isnan(short).all()
+
+
+def test_incremental_matches_full():
+    """Incremental updates reproduce the full calculation bar by bar"""
+    high, low, close = _random_ohlc(300, seed=3)
+    period, multiplier = 10, 3
+    trend, direction, _, _ = calculate_supertrend(high, low, close, period=period, multiplier=multiplier)
+
+    bootstrap = 50
+    state = init_supertrend_state(high[:bootstrap], low[:bootstrap], close[:bootstrap], period, multiplier)
+    for i in range(bootstrap, len(close)):
+        state, signal = calculate_supertrend_incremental(state, high[i], low[i], close[i], period, multiplier)
+        assert np.isclose(state.supertrend_prev, trend[i])
+        assert state.direction_prev == direction[i]
+        assert signal == ('BUY' if direction[i] == -1 else 'SELL')
+
+
+def test_spread_supertrend():
+    """Spread Supertrend is the Supertrend of the summed legs"""
+    legs = {}
+    for i in range(3):
+        high, low, close = _random_ohlc(150, seed=i)
+        legs[f'leg{i}'] = pd.DataFrame({'high': high, 'low': low, 'close': close})
+
+    result = calculate_spread_supertrend(legs)
+    combined = sum(df for df in legs.values())
+    trend, direction, _, _ = calculate_supertrend(combined['high'], combined['low'], combined['close'])
+
+    np.testing.assert_allclose(np.asarray(result['close']), combined['close'].values)
+    np.testing.assert_allclose(result['supertrend'], trend, equal_nan=True)
+    np.testing.assert_array_equal(result['direction'], direction)
+
+
+if __name__ == '__main__':
+    test_matches_openalgo()
+    test_nan_input_matches_openalgo()
+    test_series_input()
+    test_insufficient_data()
+    test_incremental_matches_full()
+    test_spread_supertrend()
+    print("All Supertrend tests passed")
@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+"""
+Test script to verify subscription and risk handling in websocket_service
+
+Runs the service against a throwaway SQLite database and a fake OpenAlgo
+client; ticks are flushed synchronously instead of by the flush thread.
+"""
+
+import sys
+import os
+import time
+import math
+import tempfile
+import threading
+from datetime import datetime, time as dt_time, timedelta, timezone
+from unittest import mock
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# websocket_service logs to logs/ from import time
+os.makedirs(os.path.join(ROOT, 'logs'), exist_ok=True)
+
+import websocket_service as ws
+from config import Config
+from app import db
+from app.models import User, TradingAccount, Strategy, StrategyLeg, StrategyExecution, RiskEvent
+from app.utils import shared_prices
+from app.utils.shared_prices import read_shared_prices
+
+# Throwaway database, session store and shared files for every app the
+# service builds (config may already have been imported by another test)
+TMP_DIR = tempfile.mkdtemp(prefix='algomirror_ws_test_')
+Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(TMP_DIR, 'ws.db')
+Config.SESSION_FILE_DIR = os.path.join(TMP_DIR, 'flask_session')
+ws.SHARED_PRICES_PATH = os.path.join(TMP_DIR, 'prices.mmap')
+ws.SHARED_DATA_PATH = os.path.join(TMP_DIR, 'websocket_data.json')
+
+CE = ('NFO', 'NIFTYCE')
+PE = ('NFO', 'NIFTYPE')
+
+
+class FakeClient:
+    """Stands in for the OpenAlgo client, recording each (un)subscribe batch"""
+
+    def __init__(self, ok=True):
+        self.ok = ok  # what the SDK returns: False on failure, no exception
+        self.subscribed = []
+        self.unsubscribed = []
+
+    def subscribe_quote(self, instruments, on_data_received=None):
+        self.subscribed.append([(i['exchange'], i['symbol']) for i in instruments])
+        return self.ok
+
+    def unsubscribe_quote(self, instruments):
+        self.unsubscribed.append([(i['exchange'], i['symbol']) for i in instruments])
+        return self.ok
+
+    def disconnect(self):
+        pass
+
+
+def _make_service(client=None):
+    """
+    Service with two open SELL positions (entry 100) on one leg:
+    stop-loss at 110, take-profit at 80
+    """
+    service = ws.StandaloneWebSocketService()
+    with service._app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        user = User(username='trader', email='trader@example.com')
+        user.set_password('Passw0rd!x')
+        db.session.add(user)
+        db.session.commit()
+
+        account = TradingAccount(user_id=user.id, account_name='main', broker_name='broker',
+                                 host_url='http://127.0.0.1:5000', websocket_url='ws://127.0.0.1:8765',
+                                 is_primary=True)
+        account.set_api_key('key')
+        strategy = Strategy(user_id=user.id, name='straddle')
+        db.session.add_all([account, strategy])
+        db.session.commit()
+
+        leg = StrategyLeg(strategy_id=strategy.id, leg_number=1, action='SELL',
+                          stop_loss_type='points', stop_loss_value=10,
+                          take_profit_type='percentage', take_profit_value=20)
+        db.session.add(leg)
+        db.session.commit()
+
+        for exchange, symbol in (CE, PE):
+            db.session.add(StrategyExecution(
+                strategy_id=strategy.id, account_id=account.id, leg_id=leg.id,
+                symbol=symbol, exchange=exchange, entry_price=100, quantity=75, status='entered'
+            ))
+        db.session.commit()
+
+    service.client = client or FakeClient()
+    service.connected = True
+    return service
+
+
+def _execution(service, key):
+    """Detached copy of the execution row for (exchange, symbol)"""
+    with service._app.app_context():
+        execution = StrategyExecution.query.filter_by(exchange=key[0], symbol=key[1]).one()
+        db.session.expunge(execution)
+        return execution
+
+
+def _tick(service, key, ltp):
+    """Deliver one quote and flush it as the flush thread would"""
+    service.on_quote_data({'exchange': key[0], 'symbol': key[1], 'data': {'ltp': ltp}})
+    batch = []
+    service._drain_ticks(batch)
+    service._flush_ticks(batch)
+
+
+def _wait_for_exits(service, timeout=5):
+    """Block until every fired exit has been recorded by the exit executor"""
+    deadline = time.monotonic() + timeout
+    while any(committed is None for committed in service._fired_exits.values()):
+        assert time.monotonic() < deadline, "exit was not recorded"
+        time.sleep(0.01)
+
+
+def _risk_events(service):
+    """(execution_id, event_type) of every recorded risk event"""
+    with service._app.app_context():
+        return [(event.execution_id, event.event_type) for event in RiskEvent.query.all()]
+
+
+def _set_status(service, key, status):
+    """Change an execution's status behind the service's back"""
+    with service._app.app_context():
+        StrategyExecution.query.filter_by(exchange=key[0], symbol=key[1]).update({'status': status})
+        db.session.commit()
+
+
+def test_failed_subscribe_is_retried():
+    """Keys are recorded only when the SDK reports success"""
+    client = FakeClient(ok=False)
+    service = _make_service(client)
+    try:
+        service.subscribe_to_positions()
+        assert service.subscriptions == {}
+
+        client.ok = True
+        service.subscribe_to_positions()
+        assert client.subscribed == [[CE, PE], [CE, PE]]
+        assert list(service.subscriptions) == [CE, PE]
+
+        # Nothing left to send once both are recorded
+        service.subscribe_to_positions()
+        assert len(client.subscribed) == 2
+    finally:
+        service.stop()
+
+
+def test_failed_unsubscribe_is_retried():
+    """A closed position stays subscribed until the SDK reports the unsubscribe"""
+    client = FakeClient()
+    service = _make_service(client)
+    try:
+        service.subscribe_to_positions()
+        _tick(service, PE, 95)
+        assert 'NFO:NIFTYPE' in read_shared_prices(ws.SHARED_PRICES_PATH)
+        _set_status(service, PE, 'exited')
+
+        client.ok = False
+        service.subscribe_to_positions()
+        assert client.unsubscribed == [[PE]]
+        assert PE in service.subscriptions
+
+        client.ok = True
+        service.subscribe_to_positions()
+        assert client.unsubscribed == [[PE], [PE]]
+        assert list(service.subscriptions) == [CE]
+
+        # The closed position's shared-table slot was released
+        assert 'NFO:NIFTYPE' not in read_shared_prices(ws.SHARED_PRICES_PATH)
+    finally:
+        service.stop()
+
+
+def test_flush_skips_exited_execution():
+    """A tick for a position exited since the last refresh leaves its row alone"""
+    service = _make_service()
+    try:
+        service.subscribe_to_positions()
+        _tick(service, PE, 95)
+        assert _execution(service, PE).unrealized_pnl == 375
+
+        _set_status(service, PE, 'exited')
+        _tick(service, CE, 96)
+        _tick(service, PE, 90)
+
+        exited = _execution(service, PE)
+        assert exited.last_price == 95
+        assert exited.unrealized_pnl == 375
+        assert _execution(service, CE).unrealized_pnl == 300
+    finally:
+        service.stop()
+
+
+def test_flush_without_redis():
+    """Mirror enabled but redis missing or unreachable: ticks still price positions"""
+    with mock.patch.object(shared_prices, 'REDIS_PRICE_PUBLISH', True), \
+            mock.patch.dict(os.environ, {'REDIS_URL': 'redis://127.0.0.1:6379/0'}), \
+            mock.patch.dict(sys.modules, {'redis': None}):
+        service = _make_service()
+    try:
+        assert service._redis is None
+        service.subscribe_to_positions()
+        _tick(service, CE, 95)
+        assert _execution(service, CE).unrealized_pnl == 375
+    finally:
+        service.stop()
+
+    # Configured, but nothing listens on the port: publishing backs off
+    with mock.patch.object(shared_prices, 'REDIS_PRICE_PUBLISH', True), \
+            mock.patch.dict(os.environ, {'REDIS_URL': 'redis://127.0.0.1:1/0'}):
+        service = _make_service()
+    try:
+        assert service._redis is not None
+        service.subscribe_to_positions()
+        _tick(service, CE, 95)
+        assert _execution(service, CE).unrealized_pnl == 375
+        assert service._redis_retry_at > 0
+    finally:
+        service.stop()
+
+
+def test_trigger_after_stop():
+    """A flush that races stop() still commits P&L and records its exit"""
+    service = _make_service()
+    service.subscribe_to_positions()
+    service.stop()
+
+    _tick(service, CE, 111)
+    execution = _execution(service, CE)
+    assert execution.unrealized_pnl == -825
+    assert execution.sl_hit_price == 111
+    assert execution.exit_reason == 'stop_loss'
+
+
+def test_refresh_sends_only_deltas():
+    """Refreshes subscribe new positions and unsubscribe closed ones, nothing else"""
+    client = FakeClient()
+    service = _make_service(client)
+    try:
+        service.subscribe_to_positions()
+        service.subscribe_to_positions()
+        assert client.subscribed == [[CE, PE]]
+        assert client.unsubscribed == []
+
+        _set_status(service, PE, 'exited')
+        with service._app.app_context():
+            ce = StrategyExecution.query.filter_by(symbol=CE[1]).one()
+            db.session.add(StrategyExecution(
+                strategy_id=ce.strategy_id, account_id=ce.account_id, leg_id=ce.leg_id,
+                symbol='BANKNIFTYCE', exchange='NFO', entry_price=200, quantity=30, status='entered'
+            ))
+            db.session.commit()
+
+        service.subscribe_to_positions()
+        assert client.subscribed == [[CE, PE], [('NFO', 'BANKNIFTYCE')]]
+        assert client.unsubscribed == [[PE]]
+        assert list(service.subscriptions) == [CE, ('NFO', 'BANKNIFTYCE')]
+    finally:
+        service.stop()
+
+
+def test_stop_loss_fires_once():
+    """Repeated ticks beyond the stop hand one exit to the executor and log one event"""
+    service = _make_service()
+    try:
+        service.subscribe_to_positions()
+        exec_id = _execution(service, CE).id
+        with mock.patch.object(service._db_executor, 'submit', wraps=service._db_executor.submit) as submit:
+            _tick(service, CE, 111)
+            _tick(service, CE, 112)
+            _wait_for_exits(service)
+            _tick(service, CE, 113)
+
+        assert submit.call_count == 1
+        assert _risk_events(service) == [(exec_id, 'stop_loss')]
+        execution = _execution(service, CE)
+        assert execution.sl_hit_price == 111
+        assert execution.tp_hit_at is None
+        # P&L keeps following the price after the exit fired
+        assert execution.last_price == 113
+    finally:
+        service.stop()
+
+
+def test_refresh_does_not_refire():
+    """Once the exit is committed, a refresh loads the position without thresholds"""
+    service = _make_service()
+    try:
+        service.subscribe_to_positions()
+        _tick(service, CE, 111)
+        _wait_for_exits(service)
+
+        service.subscribe_to_positions()
+        position = service._positions_by_key[CE][0]
+        assert position.sl_price is None and position.tp_price is None
+        assert service._fired_exits == {}
+
+        with mock.patch.object(service._db_executor, 'submit') as submit:
+            _tick(service, CE, 115)
+            _tick(service, CE, 70)
+        submit.assert_not_called()
+        assert len(_risk_events(service)) == 1
+    finally:
+        service.stop()
+
+
+def test_disarmed_until_commit_visible():
+    """A refresh that runs before the exit commits must not re-arm the position"""
+    service = _make_service()
+    release = threading.Event()
+    record_exit = service._trigger_exit
+
+    def slow_trigger_exit(*args):
+        release.wait(5)
+        record_exit(*args)
+
+    service._trigger_exit = slow_trigger_exit
+    try:
+        service.subscribe_to_positions()
+        exec_id = _execution(service, CE).id
+        _tick(service, CE, 111)
+        assert service._fired_exits == {exec_id: None}
+
+        # The DB does not show the exit yet; the refresh must keep it disarmed
+        service.subscribe_to_positions()
+        assert service._positions_by_key[CE][0].sl_price is None
+        assert exec_id in service._fired_exits
+        with mock.patch.object(service._db_executor, 'submit') as submit:
+            _tick(service, CE, 112)
+        submit.assert_not_called()
+
+        release.set()
+        _wait_for_exits(service)
+        # The first refresh after the commit reads it from the DB
+        service.subscribe_to_positions()
+        assert service._fired_exits == {}
+        assert service._positions_by_key[CE][0].sl_price is None
+        assert _risk_events(service) == [(exec_id, 'stop_loss')]
+    finally:
+        release.set()
+        service.stop()
+
+
+def test_trigger_band():
+    """Band bounds per side, and ticks on a bound (not inside) fire"""
+    band = ws.StandaloneWebSocketService._trigger_band
+    assert band('BUY', 90, 120) == (90, 120)
+    assert band('SELL', 110, 80) == (80, 110)
+    assert band('BUY', None, None) == (-math.inf, math.inf)
+    assert band('SELL', 110, None) == (-math.inf, 110)
+
+    service = _make_service()
+    try:
+        service.subscribe_to_positions()
+        assert service._positions_by_key[CE][0][-2:] == (80, 110)
+
+        with mock.patch.object(service._db_executor, 'submit') as submit:
+            _tick(service, CE, 109.95)
+            _tick(service, PE, 80.05)
+            submit.assert_not_called()
+
+            _tick(service, CE, 110)
+            _tick(service, PE, 80)
+        ce, pe = _execution(service, CE), _execution(service, PE)
+        assert [call.args[1:4] for call in submit.call_args_list] == [
+            (ce.id, ce.strategy_id, 'stop_loss'),
+            (pe.id, pe.strategy_id, 'take_profit'),
+        ]
+    finally:
+        service.stop()
+
+
+def test_ist_datetimes_use_fixed_offset():
+    """
+    IST datetimes the service builds (datetime.combine(..., tzinfo=self.ist),
+    now.replace(hour=...)) are UTC+05:30: self.ist is a fixed offset, so a
+    pytz-style LMT (+05:53) offset cannot leak in
+    """
+    service = _make_service()
+    try:
+        assert service.ist.utcoffset(None) == timedelta(hours=5, minutes=30)
+
+        # Sessions every day, so today has a window whatever the weekday
+        service.cached_sessions = [
+            {'day_of_week': day, 'start_time': dt_time(9, 15), 'pre_market_time': dt_time(9, 0),
+             'end_time': dt_time(15, 30), 'is_active': True}
+            for day in range(7)
+        ]
+        service._index_sessions()
+        service.cache_refresh_time = datetime.now(service.ist)
+        service._build_today_windows()
+
+        today = datetime.now(service.ist).date()
+        assert service._today_windows == ((
+            datetime.combine(today, dt_time(3, 30), tzinfo=timezone.utc).timestamp(),
+            datetime.combine(today, dt_time(10, 0), tzinfo=timezone.utc).timestamp()
+        ),)
+
+        # Next pre-market open (today's or tomorrow's) is 03:30 UTC
+        opens_at = datetime.fromtimestamp(time.time() + service.get_time_until_market_open(), timezone.utc)
+        assert (opens_at + timedelta(seconds=1)).strftime('%H:%M') == '03:30'
+    finally:
+        service.stop()
+
+
+def test_snapshot_fsync_only_on_shutdown():
+    """Running snapshots skip fsync; the one written by stop() is synced"""
+    service = _make_service()
+    try:
+        service.subscribe_to_positions()
+        _tick(service, CE, 95)
+        with mock.patch.object(ws.os, 'fsync') as fsync:
+            service._save_prices()
+            fsync.assert_not_called()
+            service.stop()
+            fsync.assert_called_once()
+        with open(ws.SHARED_DATA_PATH) as f:
+            assert '"NFO:NIFTYCE"' in f.read()
+    finally:
+        service.stop()
+
+
+if __name__ == '__main__':
+    test_failed_subscribe_is_retried()
+    test_failed_unsubscribe_is_retried()
+    test_flush_skips_exited_execution()
+    test_flush_without_redis()
+    test_trigger_after_stop()
+    test_refresh_sends_only_deltas()
+    test_stop_loss_fires_once()
+    test_refresh_does_not_refire()
+    test_disarmed_until_commit_visible()
+    test_trigger_band()
+    test_ist_datetimes_use_fixed_offset()
+    test_snapshot_fsync_only_on_shutdown()
+    print("All WebSocket service tests passed")
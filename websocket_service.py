@@ -7,7 +7,8 @@ This service uses the OpenAlgo Python SDK for WebSocket connections:
 1. Maintains persistent WebSocket connections to OpenAlgo
 2. Updates position P&L in the database
 3. Triggers stop-loss/take-profit via order_status_poller integration
-4. Writes latest prices to a shared file for the main app
+4. Writes latest prices to shared memory for the main app
+   (app.utils.shared_prices), plus a periodic JSON snapshot
 
 Usage:
     python websocket_service.py
@@ -19,13 +20,21 @@ Or run via systemd:
 import os
 import sys
 import json
+import math
 import time
+import queue
 import signal
 import logging
 import threading
-from datetime import datetime, time as dt_time, timedelta, date
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta, date, timezone
 from pathlib import Path
-import pytz
+
+try:
+    import orjson
+except ImportError:  # optional faster serializer, stdlib json otherwise
+    orjson = None
 
 # Add the app directory to path
 app_dir = Path(__file__).parent.resolve()
@@ -46,17 +55,67 @@ logger = logging.getLogger('WebSocketService')
 from openalgo import api
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables (before app imports, config reads them at import)
 load_dotenv(os.path.join(app_dir, '.env'))
 
-# Shared data file path
+from sqlalchemy import and_, update, bindparam
+from app import create_app, db
+from app.models import (
+    TradingAccount, TradingSession, MarketHoliday, SpecialTradingSession,
+    Strategy, StrategyLeg, StrategyExecution, RiskEvent
+)
+from app.utils.shared_prices import (
+    SharedPriceWriter, SHARED_PRICES_PATH, REDIS_PRICES_KEY, REDIS_TICK_CHANNEL,
+    create_redis_client
+)
+
+# Ticks are buffered per symbol (last write wins) and flushed on this cadence
+TICK_FLUSH_MS = int(os.environ.get('TICK_FLUSH_MS', '50'))
+# Position P&L is written when it moves by more than this fraction, or at
+# least every PNL_PERSIST_INTERVAL seconds while the symbol keeps ticking
+PNL_PERSIST_CHANGE = 0.001
+PNL_PERSIST_INTERVAL = 2.0
+# Upper bound on ticks drained per flush so a burst cannot stall the loop
+TICK_BATCH_MAX = 5000
+# Holidays/special sessions are cached for this many days ahead; the cache is
+# refreshed daily, and scheduling looks at most a week ahead
+CALENDAR_LOOKAHEAD_DAYS = 14
+# WebSocket connects this long before each session opens
+PRE_MARKET_BUFFER = timedelta(minutes=15)
+# Subscriptions are re-synced with open positions on this cadence (seconds)
+SUBSCRIPTION_REFRESH_INTERVAL = 60
+# JSON snapshot is rewritten at most this often while prices change (seconds)
+SNAPSHOT_INTERVAL = 0.1
+
+# Risk inputs of one open position, cached so tick processing is pure arithmetic
+PositionSnapshot = namedtuple('PositionSnapshot', [
+    'execution_id', 'strategy_id', 'sl_price', 'tp_price', 'side', 'entry_price', 'quantity',
+    'trigger_low', 'trigger_high'
+])
+
+# Per-flush P&L write: one Core UPDATE run as an executemany, bypassing the
+# ORM unit of work; its compiled form is reused from the engine's cache.
+# Only 'entered' rows match, so a flush cannot overwrite an execution that
+# was exited after the last position refresh
+_executions = StrategyExecution.__table__
+UPDATE_PNL = update(_executions).where(
+    _executions.c.id == bindparam('b_id'),
+    _executions.c.status == 'entered'
+).values(
+    last_price=bindparam('b_px'),
+    last_price_updated=bindparam('b_ts'),
+    unrealized_pnl=bindparam('b_pnl')
+)
+
+# JSON snapshot of latest prices (debugging/compatibility; live readers use
+# the shared-memory table at SHARED_PRICES_PATH)
 SHARED_DATA_PATH = os.path.join(app_dir, 'instance', 'websocket_data.json')
 
 
 class StandaloneWebSocketService:
     """
     Standalone WebSocket service using OpenAlgo SDK.
-    Shares data via file-based storage for simplicity.
+    Shares prices via a memory-mapped table written in place per tick.
     """
 
     def __init__(self):
@@ -65,43 +124,77 @@ class StandaloneWebSocketService:
         self.ws_url = None
         self.api_key = None
         self.connected = False
-        self.subscriptions = set()
-        self.latest_prices = {}  # symbol -> {ltp, timestamp, ...}
-        self._lock = threading.Lock()
+        self.subscriptions = {}  # (exchange, symbol) -> None, an ordered set
+        # (exchange, symbol) of every open position; ticks for anything else
+        # (stale subscriptions, extra feed ticks) are dropped on arrival
+        self._tracked = frozenset()
+        self._subscriptions_snapshot = ()  # "EX:SYM" strings for the JSON snapshot
+        self.latest_prices = {}  # symbol -> {ltp, timestamp_ns, ...}
+        self._lock = threading.Lock()  # guards latest_prices (flush thread vs stop_websocket)
         self._shutdown = False
+        self._shutdown_event = threading.Event()  # wakes run() for immediate shutdown
+        self._prices_dirty = threading.Event()  # set by flushes, consumed by the snapshot thread
+        self._tick_q = queue.SimpleQueue()  # (exchange, symbol, market_data, timestamp_ns)
+        self._flush_thread = None
+        self._snapshot_thread = None
+
+        # Risk inputs of open positions, rebuilt with the subscriptions so the
+        # flush loop needs no ORM access unless an exit triggers
+        self._positions_by_key = {}  # (exchange, symbol) -> (PositionSnapshot, ...)
+        # Fired exits stay disarmed until a refresh whose query started after
+        # the exit's commit: execution_id -> refresh generation at commit
+        # (None while the commit is pending)
+        self._fired_exits = {}
+        self._refresh_gen = 0
+        self._cache_lock = threading.Lock()  # guards _positions_by_key swaps and _fired_exits
+        self._last_persisted = {}  # execution_id -> (unrealized_pnl, monotonic time)
+        # Exits are persisted off the flush thread so a slow commit cannot
+        # hold up P&L for the rest of the book
+        self._db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='RiskExit')
 
         # Ensure instance directory exists
         os.makedirs(os.path.dirname(SHARED_DATA_PATH), exist_ok=True)
 
+        # Fixed-size shared price table, one record per subscribed symbol
+        self._price_writer = SharedPriceWriter(SHARED_PRICES_PATH)
+        # Redis mirror of each flush (REDIS_PRICE_PUBLISH), None when off
+        self._redis = create_redis_client()
+        if self._redis is not None:
+            logger.info("Publishing prices to Redis")
+        self._redis_retry_at = 0.0  # monotonic time publishing resumes after a failure
+
+        # Flask app built once; DB work only pushes a (cheap) app context
+        self._app = create_app()
+
         # Register signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
 
         # Trading hours from database (will be loaded dynamically)
-        self.ist = pytz.timezone('Asia/Kolkata')
+        # IST has no DST, so a fixed offset replaces the pytz zone lookup
+        self.ist = timezone(timedelta(hours=5, minutes=30), name='IST')
         self.cached_sessions = []
         self.cached_holidays = {}
         self.cached_special_sessions = {}
         self.cache_refresh_time = None
+        self._weekday_bounds = {}  # day_of_week -> [(pre_market_time, end_time), ...]
+
+        # Today's (open_epoch, close_epoch) windows, rebuilt on date rollover
+        self._today_windows = None
+        self._windows_valid_until = 0
 
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         logger.info(f"Received signal {signum}, shutting down...")
-        self._shutdown = True
         self.stop()
 
     def refresh_trading_hours_cache(self):
         """Load trading hours from database into cache"""
         try:
-            from app import create_app, db
-            from app.models import TradingSession, MarketHoliday, SpecialTradingSession
-            from sqlalchemy import and_
-
-            app = create_app()
-            with app.app_context():
+            with self._app.app_context():
                 now = datetime.now(self.ist)
-                year_start = date(now.year, 1, 1)
-                year_end = date(now.year, 12, 31)
+                window_start = now.date()
+                window_end = window_start + timedelta(days=CALENDAR_LOOKAHEAD_DAYS)
 
                 # Cache regular trading sessions
                 sessions = TradingSession.query.filter_by(is_active=True).all()
@@ -110,6 +203,7 @@ class StandaloneWebSocketService:
                     self.cached_sessions.append({
                         'day_of_week': session.day_of_week,
                         'start_time': session.start_time,
+                        'pre_market_time': self._pre_market_time(session.start_time),
                         'end_time': session.end_time,
                         'is_active': session.is_active
                     })
@@ -117,8 +211,8 @@ class StandaloneWebSocketService:
                 # Cache holidays
                 holidays = MarketHoliday.query.filter(
                     and_(
-                        MarketHoliday.holiday_date >= year_start,
-                        MarketHoliday.holiday_date <= year_end
+                        MarketHoliday.holiday_date >= window_start,
+                        MarketHoliday.holiday_date <= window_end
                     )
                 ).all()
 
@@ -132,8 +226,8 @@ class StandaloneWebSocketService:
                 # Cache special sessions
                 special_sessions = SpecialTradingSession.query.filter(
                     and_(
-                        SpecialTradingSession.session_date >= year_start,
-                        SpecialTradingSession.session_date <= year_end,
+                        SpecialTradingSession.session_date >= window_start,
+                        SpecialTradingSession.session_date <= window_end,
                         SpecialTradingSession.is_active == True
                     )
                 ).all()
@@ -145,10 +239,13 @@ class StandaloneWebSocketService:
                     self.cached_special_sessions[session.session_date].append({
                         'session_name': session.session_name,
                         'start_time': session.start_time,
+                        'pre_market_time': self._pre_market_time(session.start_time),
                         'end_time': session.end_time
                     })
 
+                self._index_sessions()
                 self.cache_refresh_time = datetime.now(self.ist)
+                self._today_windows = None
                 logger.info(f"Trading hours cache refreshed: {len(self.cached_sessions)} sessions, "
                           f"{len(self.cached_holidays)} holidays, "
                           f"{len(self.cached_special_sessions)} special sessions")
@@ -162,63 +259,97 @@ class StandaloneWebSocketService:
         """Set default NSE trading hours if database not available"""
         logger.warning("Using default NSE trading hours (database unavailable)")
         self.cached_sessions = [
-            {'day_of_week': i, 'start_time': dt_time(9, 15), 'end_time': dt_time(15, 30), 'is_active': True}
+            {'day_of_week': i, 'start_time': dt_time(9, 15), 'pre_market_time': dt_time(9, 0),
+             'end_time': dt_time(15, 30), 'is_active': True}
             for i in range(5)  # Monday to Friday
         ]
         self.cached_holidays = {}
         self.cached_special_sessions = {}
+        self._index_sessions()
+
+    def _index_sessions(self):
+        """Group active regular sessions by weekday as (pre_market_time, end_time) bounds"""
+        bounds = {}
+        for session in self.cached_sessions:
+            if session['is_active']:
+                bounds.setdefault(session['day_of_week'], []).append(
+                    (session['pre_market_time'], session['end_time'])
+                )
+        for day_bounds in bounds.values():
+            day_bounds.sort()
+        self._weekday_bounds = bounds
 
-    def is_trading_hours(self) -> bool:
+    @staticmethod
+    def _pre_market_time(start_time):
+        """Session start less the pre-market buffer, computed once per cache refresh"""
+        return (datetime.combine(date.min, start_time) - PRE_MARKET_BUFFER).time()
+
+    def _build_today_windows(self):
         """
-        Check if current time is within trading hours based on database settings.
-        Includes 15-minute pre-market buffer for WebSocket startup.
+        Precompute today's trading windows as (open_epoch, close_epoch) pairs,
+        including the 15-minute pre-market buffer. Valid until the next
+        midnight, or until the 5 AM cache refresh if that is still due.
         """
-        try:
-            now = datetime.now(self.ist)
-            current_day = now.weekday()  # 0=Monday, 6=Sunday
-            current_time = now.time()
-            current_date = now.date()
+        now = datetime.now(self.ist)
+        current_date = now.date()
+        refresh_at = datetime.combine(current_date, dt_time(5, 0), tzinfo=self.ist)
 
-            # Refresh cache if needed (once per day at 5 AM)
-            if (self.cache_refresh_time is None or
-                (now.hour == 5 and now.minute < 5 and
-                 (self.cache_refresh_time.date() != current_date))):
-                self.refresh_trading_hours_cache()
+        # Refresh cache if needed (once per day at 5 AM)
+        if self.cache_refresh_time is None or (now >= refresh_at and self.cache_refresh_time < refresh_at):
+            self.refresh_trading_hours_cache()
 
-            # If no cached sessions, use defaults
-            if not self.cached_sessions:
-                self._set_default_cache()
-
-            # Check for special trading session first (e.g., Muhurat trading)
-            if current_date in self.cached_special_sessions:
-                for session in self.cached_special_sessions[current_date]:
-                    # Include 15-minute pre-market buffer
-                    pre_market = (datetime.combine(current_date, session['start_time']) - timedelta(minutes=15)).time()
-                    if pre_market <= current_time <= session['end_time']:
-                        logger.debug(f"Special session active: {session['session_name']}")
-                        return True
-
-            # Check if it's a holiday (without special session)
-            if current_date in self.cached_holidays:
-                holiday_info = self.cached_holidays[current_date]
-                if not holiday_info.get('is_special_session', False):
-                    logger.debug(f"Market holiday: {holiday_info.get('holiday_name', 'Unknown')}")
-                    return False
+        # If no cached sessions, use defaults
+        if not self.cached_sessions:
+            self._set_default_cache()
 
-            # Check regular trading sessions for current day
-            for session in self.cached_sessions:
-                if session['day_of_week'] == current_day and session['is_active']:
-                    # Include 15-minute pre-market buffer
-                    pre_market = (datetime.combine(current_date, session['start_time']) - timedelta(minutes=15)).time()
-                    if pre_market <= current_time <= session['end_time']:
-                        return True
+        def window(pre_market_time, end_time):
+            start = datetime.combine(current_date, pre_market_time, tzinfo=self.ist)
+            end = datetime.combine(current_date, end_time, tzinfo=self.ist)
+            return (start.timestamp(), end.timestamp())
 
-            return False
+        # Special trading sessions (e.g., Muhurat trading) apply even on holidays
+        windows = [
+            window(session['pre_market_time'], session['end_time'])
+            for session in self.cached_special_sessions.get(current_date, [])
+        ]
+
+        # Regular sessions, unless it's a holiday (without special session)
+        holiday_info = self.cached_holidays.get(current_date)
+        if holiday_info and not holiday_info.get('is_special_session', False):
+            logger.debug(f"Market holiday: {holiday_info.get('holiday_name', 'Unknown')}")
+        else:
+            windows.extend(
+                window(pre_market_time, end_time)
+                for pre_market_time, end_time in self._weekday_bounds.get(now.weekday(), ())
+            )
+
+        self._today_windows = tuple(windows)
+        next_midnight = datetime.combine(current_date + timedelta(days=1), dt_time(0, 0), tzinfo=self.ist)
+        self._windows_valid_until = (refresh_at if now < refresh_at else next_midnight).timestamp()
+
+    def is_trading_hours(self) -> bool:
+        """
+        Check if current time is within trading hours based on database settings.
+        Includes 15-minute pre-market buffer for WebSocket startup.
+        """
+        try:
+            return self._current_window() is not None
 
         except Exception as e:
             logger.error(f"Error checking trading hours: {e}")
             return False
 
+    def _current_window(self):
+        """Today's (open_epoch, close_epoch) window containing now, or None"""
+        now = time.time()
+        if self._today_windows is None or now >= self._windows_valid_until:
+            self._build_today_windows()
+
+        for open_ts, close_ts in self._today_windows:
+            if open_ts <= now <= close_ts:
+                return open_ts, close_ts
+        return None
+
     def get_time_until_market_open(self) -> int:
         """
         Calculate seconds until next market open based on database settings.
@@ -236,16 +367,10 @@ class StandaloneWebSocketService:
                 if not self.cached_sessions:
                     self._set_default_cache()
 
-            # Find session for current day
-            current_session = None
-            for session in self.cached_sessions:
-                if session['day_of_week'] == current_day and session['is_active']:
-                    current_session = session
-                    break
-
             # If it's a trading day and before market open (with 15-min buffer)
-            if current_session:
-                pre_market = (datetime.combine(current_date, current_session['start_time']) - timedelta(minutes=15)).time()
+            today_bounds = self._weekday_bounds.get(current_day)
+            if today_bounds:
+                pre_market = today_bounds[0][0]
                 if current_time < pre_market:
                     # Check if today is a holiday
                     if current_date not in self.cached_holidays or \
@@ -269,13 +394,11 @@ class StandaloneWebSocketService:
                    not self.cached_holidays[next_date].get('is_special_session', False):
                     continue
 
-                # Find session for next day
-                for session in self.cached_sessions:
-                    if session['day_of_week'] == next_day and session['is_active']:
-                        pre_market = (datetime.combine(next_date, session['start_time']) - timedelta(minutes=15)).time()
-                        next_market_open = datetime.combine(next_date, pre_market)
-                        next_market_open = self.ist.localize(next_market_open)
-                        return int((next_market_open - now).total_seconds())
+                # Earliest session of the next day
+                next_bounds = self._weekday_bounds.get(next_day)
+                if next_bounds:
+                    next_market_open = datetime.combine(next_date, next_bounds[0][0], tzinfo=self.ist)
+                    return int((next_market_open - now).total_seconds())
 
             # Fallback: wait 1 hour and check again
             return 3600
@@ -287,11 +410,7 @@ class StandaloneWebSocketService:
     def load_config_from_db(self):
         """Load WebSocket configuration from database"""
         try:
-            from app import create_app, db
-            from app.models import TradingAccount
-
-            app = create_app()
-            with app.app_context():
+            with self._app.app_context():
                 # Get primary account with WebSocket URL
                 primary_account = TradingAccount.query.filter(
                     TradingAccount.is_primary == True
@@ -321,32 +440,124 @@ class StandaloneWebSocketService:
             return False
 
     def get_open_positions(self):
-        """Get symbols with open positions from database"""
-        try:
-            from app import create_app, db
-            from app.models import StrategyExecution
+        """Get symbols with open positions from database and cache their risk inputs"""
+        with self._cache_lock:
+            self._refresh_gen += 1
+            refresh_gen = self._refresh_gen
 
-            app = create_app()
-            with app.app_context():
-                # Get all entered (open) positions
-                open_executions = StrategyExecution.query.filter(
+        try:
+            with self._app.app_context():
+                # Only the columns the service needs, as plain rows (no ORM
+                # objects). SL/TP come from the position's leg.
+                rows = db.session.query(
+                    StrategyExecution.id,
+                    StrategyExecution.symbol,
+                    StrategyExecution.exchange,
+                    StrategyExecution.strategy_id,
+                    StrategyExecution.entry_price,
+                    StrategyExecution.quantity,
+                    StrategyExecution.sl_hit_at,
+                    StrategyExecution.tp_hit_at,
+                    StrategyExecution.exit_order_id,
+                    Strategy.id.label('strategy_found'),
+                    StrategyLeg.action,
+                    StrategyLeg.stop_loss_type,
+                    StrategyLeg.stop_loss_value,
+                    StrategyLeg.take_profit_type,
+                    StrategyLeg.take_profit_value
+                ).outerjoin(
+                    Strategy, StrategyExecution.strategy_id == Strategy.id
+                ).outerjoin(
+                    StrategyLeg, StrategyExecution.leg_id == StrategyLeg.id
+                ).filter(
                     StrategyExecution.status == 'entered'
                 ).all()
 
                 instruments = []
-                for exec in open_executions:
-                    if exec.symbol:
+                positions_by_key = {}
+                for row in rows:
+                    if row.symbol:
+                        exchange = row.exchange or 'NFO'
                         instruments.append({
-                            'symbol': exec.symbol,
-                            'exchange': exec.exchange or 'NFO'
+                            'symbol': row.symbol,
+                            'exchange': exchange
                         })
 
+                        if row.strategy_found is None:
+                            continue
+                        side = row.action or 'BUY'
+                        entry_price = row.entry_price or 0
+                        quantity = row.quantity or 0
+                        # Positions whose exit already fired (or whose exit order
+                        # is placed) are tracked for P&L only
+                        exit_fired = (row.sl_hit_at is not None or row.tp_hit_at is not None
+                                      or row.exit_order_id)
+                        sl_price = tp_price = None
+                        if not exit_fired and entry_price > 0:
+                            sl_price = self._exit_price(
+                                side, entry_price, row.stop_loss_type, row.stop_loss_value, -1)
+                            tp_price = self._exit_price(
+                                side, entry_price, row.take_profit_type, row.take_profit_value, 1)
+                        positions_by_key.setdefault((exchange, row.symbol), []).append(PositionSnapshot(
+                            row.id, row.strategy_id, sl_price, tp_price, side, entry_price, quantity,
+                            *self._trigger_band(side, sl_price, tp_price)
+                        ))
+
+                with self._cache_lock:
+                    # Exits fired before or during the query stay disarmed even
+                    # if their sl_hit_at/tp_hit_at commit was not visible to it
+                    fired = self._fired_exits
+                    # Swap in one whole dict so the flush thread never sees a partial cache
+                    self._positions_by_key = {
+                        key: tuple(
+                            self._disarmed(snapshot) if snapshot.execution_id in fired else snapshot
+                            for snapshot in snapshots
+                        )
+                        for key, snapshots in positions_by_key.items()
+                    }
+                    # Commits that landed before this query started are in its rows
+                    self._fired_exits = {
+                        exec_id: committed_gen for exec_id, committed_gen in fired.items()
+                        if committed_gen is None or committed_gen >= refresh_gen
+                    }
+                open_ids = {
+                    snapshot.execution_id
+                    for snapshots in positions_by_key.values() for snapshot in snapshots
+                }
+                self._last_persisted = {
+                    exec_id: persisted for exec_id, persisted in self._last_persisted.items()
+                    if exec_id in open_ids
+                }
+
                 logger.info(f"Found {len(instruments)} open positions to monitor")
                 return instruments
 
         except Exception as e:
             logger.error(f"Failed to get open positions: {e}")
-            return []
+            return None
+
+    @staticmethod
+    def _exit_price(side, entry_price, value_type, value, direction):
+        """
+        LTP at which a leg's stop-loss (direction -1) or take-profit (1) fires
+
+        Same rules as the risk monitor in app.trading.routes, which places the
+        exit order once sl_hit_at/tp_hit_at is set.
+
+        Returns:
+            Trigger price, or None when the leg has no such exit condition
+        """
+        if not value or value <= 0:
+            return None
+        # Favourable price moves are up for BUY legs and down for SELL legs
+        sign = direction if side == 'BUY' else -direction
+        if value_type == 'percentage':
+            return entry_price * (1 + sign * value / 100)
+        if value_type == 'points':
+            return entry_price + sign * value
+        if value_type == 'premium':
+            return value
+        return None
 
     def connect(self):
         """Establish WebSocket connection using OpenAlgo SDK"""
@@ -364,13 +575,18 @@ class StandaloneWebSocketService:
                 ws_url=self.ws_url
             )
 
-            # Connect to WebSocket
-            self.client.connect()
+            # Connect to WebSocket; the SDK returns once authentication
+            # completes (or fails), so no fixed settle delay is needed
+            if not self.client.connect():
+                logger.error("OpenAlgo WebSocket connection or authentication failed")
+                try:
+                    self.client.disconnect()
+                except Exception:
+                    pass
+                self.client = None
+                return False
             self.connected = True
 
-            # Wait for connection to stabilize
-            time.sleep(2)
-
             logger.info("OpenAlgo WebSocket connected successfully")
             return True
 
@@ -389,160 +605,382 @@ class StandaloneWebSocketService:
 
             symbol = data.get('symbol')
             exchange = data.get('exchange')
+
+            # Stale subscriptions and extra feed ticks have no open position
+            # to price - drop them before any work
+            if (exchange, symbol) not in self._tracked:
+                return
+
             market_data = data.get('data', {})
             ltp = market_data.get('ltp')
 
-            if symbol and ltp:
+            if ltp:
+                timestamp_ns = time.time_ns()
+                # In-place record write, no serialization or file rewrite.
+                # Lock-free: the SDK delivers on a single thread and each slot
+                # has its own seqlock for readers.
+                self._price_writer.write(
+                    exchange, symbol, ltp,
+                    market_data.get('open'), market_data.get('high'),
+                    market_data.get('low'), market_data.get('close'),
+                    market_data.get('volume'), timestamp_ns
+                )
+
+                # Risk checks and DB work happen on the flush thread
+                self._tick_q.put((exchange, symbol, market_data, timestamp_ns))
+
+        except Exception as e:
+            logger.error(f"Error processing quote data: {e}")
+
+    def _flush_loop(self):
+        """Drain queued ticks in batches, at most once every TICK_FLUSH_MS"""
+        interval = TICK_FLUSH_MS / 1000.0
+        while not self._shutdown:
+            try:
+                batch = [self._tick_q.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+            self._drain_ticks(batch)
+            try:
+                self._flush_ticks(batch)
+            except Exception as e:
+                logger.error(f"Error flushing ticks: {e}")
+            # Let the next batch accumulate
+            time.sleep(interval)
+
+    def _snapshot_loop(self):
+        """Write the JSON snapshot when prices changed, at most once every SNAPSHOT_INTERVAL"""
+        while not self._shutdown:
+            if not self._prices_dirty.wait(timeout=1.0):
+                continue
+            self._prices_dirty.clear()
+            self._save_prices()
+            # Ticks arriving meanwhile re-set the event and share the next write
+            self._shutdown_event.wait(SNAPSHOT_INTERVAL)
+
+    def _drain_ticks(self, batch):
+        """Append queued ticks to batch, up to TICK_BATCH_MAX"""
+        while len(batch) < TICK_BATCH_MAX:
+            try:
+                batch.append(self._tick_q.get_nowait())
+            except queue.Empty:
+                break
+
+    def _flush_ticks(self, batch):
+        """Coalesce a batch per symbol (last tick wins) and run risk checks once per symbol"""
+        # Ticks queued before a position closed are dropped, so they cannot
+        # re-add a pruned symbol to latest_prices
+        tracked = self._tracked
+        pending = {}
+        for exchange, symbol, market_data, timestamp_ns in batch:
+            if (exchange, symbol) in tracked:
+                pending[(exchange, symbol)] = (market_data, timestamp_ns)
+        if not pending:
+            return
+
+        flushed = {}
+        with self._lock:
+            for (exchange, symbol), (market_data, timestamp_ns) in pending.items():
                 key = f"{exchange}:{symbol}"
-                with self._lock:
-                    self.latest_prices[key] = {
-                        'symbol': symbol,
-                        'exchange': exchange,
-                        'ltp': ltp,
-                        'open': market_data.get('open'),
-                        'high': market_data.get('high'),
-                        'low': market_data.get('low'),
-                        'close': market_data.get('close'),
-                        'volume': market_data.get('volume'),
-                        'timestamp': datetime.now(self.ist).isoformat()
-                    }
+                flushed[key] = self.latest_prices[key] = {
+                    'symbol': symbol,
+                    'exchange': exchange,
+                    'ltp': market_data.get('ltp'),
+                    'open': market_data.get('open'),
+                    'high': market_data.get('high'),
+                    'low': market_data.get('low'),
+                    'close': market_data.get('close'),
+                    'volume': market_data.get('volume'),
+                    # Integer receive time; formatted only by consumers that need it
+                    'timestamp_ns': timestamp_ns
+                }
+        self._prices_dirty.set()
 
-                # Save to shared file
-                self._save_prices()
+        if self._redis is not None and time.monotonic() >= self._redis_retry_at:
+            self._publish_prices(flushed)
 
-                # Check stop-loss/take-profit triggers
-                self._check_risk_triggers(symbol, exchange, ltp)
+        # Check stop-loss/take-profit triggers for all flushed symbols at once
+        self._check_risk_triggers({
+            key: market_data.get('ltp') for key, (market_data, _) in pending.items()
+        })
 
+    def _publish_prices(self, flushed):
+        """Mirror a flush to Redis in one pipelined round-trip"""
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            payloads = {}
+            for key, entry in flushed.items():
+                payloads[key] = orjson.dumps(entry) if orjson is not None else json.dumps(entry, separators=(',', ':'))
+                pipe.publish(REDIS_TICK_CHANNEL.format(key), payloads[key])
+            pipe.hset(REDIS_PRICES_KEY, mapping=payloads)
+            pipe.execute()
         except Exception as e:
-            logger.error(f"Error processing quote data: {e}")
+            logger.warning(f"Failed to publish prices to Redis, retrying in 30 seconds: {e}")
+            self._redis_retry_at = time.monotonic() + 30
 
     def subscribe_to_positions(self):
-        """Subscribe to symbols with open positions using OpenAlgo SDK"""
+        """
+        Bring subscriptions in line with open positions using OpenAlgo SDK.
+        Only symbols that were added or closed since the last call are sent,
+        so a steady book costs no network round-trips.
+        """
         instruments = self.get_open_positions()
+        if instruments is None:
+            # Database unavailable - keep the current subscriptions
+            return
+
+        wanted = dict.fromkeys((inst['exchange'], inst['symbol']) for inst in instruments)
+        self._tracked = frozenset(wanted)
+        to_remove = [key for key in self.subscriptions if key not in wanted]
+        to_add = [key for key in wanted if key not in self.subscriptions]
 
-        if not instruments:
+        if not wanted and not to_remove:
             logger.info("No open positions to subscribe")
             return
 
-        # Unsubscribe from previous subscriptions if any
-        if self.subscriptions:
+        # Unsubscribe from symbols whose positions have closed
+        if to_remove:
             try:
-                old_instruments = [
-                    {'exchange': s.split(':')[0], 'symbol': s.split(':')[1]}
-                    for s in self.subscriptions
-                ]
-                self.client.unsubscribe_quote(old_instruments)
-                self.subscriptions.clear()
+                # The SDK returns False instead of raising; keep the keys so
+                # the next refresh retries them
+                if self.client.unsubscribe_quote([
+                    {'exchange': exchange, 'symbol': symbol}
+                    for exchange, symbol in to_remove
+                ]):
+                    for key in to_remove:
+                        del self.subscriptions[key]
+                        logger.info(f"Unsubscribed from {key[0]}:{key[1]}")
+                else:
+                    logger.warning(f"Unsubscribe failed for {len(to_remove)} instruments, will retry")
             except Exception as e:
                 logger.warning(f"Error unsubscribing old instruments: {e}")
 
+            # Closed positions drop out of the JSON snapshot as well, and free
+            # their shared-table slots for the next new symbols
+            with self._lock:
+                for exchange, symbol in to_remove:
+                    self.latest_prices.pop(f"{exchange}:{symbol}", None)
+                    self._price_writer.release(exchange, symbol)
+            self._prices_dirty.set()
+
         # Subscribe to new instruments using quote mode (for OHLCV data)
-        try:
-            self.client.subscribe_quote(instruments, on_data_received=self.on_quote_data)
+        if to_add:
+            try:
+                if self.client.subscribe_quote(
+                    [{'exchange': exchange, 'symbol': symbol} for exchange, symbol in to_add],
+                    on_data_received=self.on_quote_data
+                ):
+                    for key in to_add:
+                        self.subscriptions[key] = None
+                        logger.info(f"Subscribed to {key[0]}:{key[1]}")
+                else:
+                    # Not recorded, so the next refresh sends them again
+                    logger.error(f"Subscribe failed for {len(to_add)} instruments, will retry")
 
-            for inst in instruments:
-                key = f"{inst['exchange']}:{inst['symbol']}"
-                self.subscriptions.add(key)
-                logger.info(f"Subscribed to {key}")
+            except Exception as e:
+                logger.error(f"Error subscribing to instruments: {e}")
 
-        except Exception as e:
-            logger.error(f"Error subscribing to instruments: {e}")
+        # Rebuilt only when subscriptions change, not on every snapshot
+        self._subscriptions_snapshot = tuple(f"{exchange}:{symbol}" for exchange, symbol in self.subscriptions)
 
-    def _save_prices(self):
-        """Save latest prices to shared file"""
+    def _save_prices(self, durable=False):
+        """
+        Save a JSON snapshot of latest prices (written from the snapshot thread, not per tick)
+
+        Args:
+            durable: fsync before the rename; only the final snapshot at
+                shutdown pays for it, the debug snapshot while running does not
+        """
         try:
             with self._lock:
+                # Copy under the lock; serialization happens after releasing it
                 data = {
-                    'prices': self.latest_prices,
+                    'prices': dict(self.latest_prices),
                     'updated_at': datetime.now(self.ist).isoformat(),
-                    'subscriptions': list(self.subscriptions)
+                    'subscriptions': self._subscriptions_snapshot
                 }
 
-            with open(SHARED_DATA_PATH, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Write a sibling file and rename it over the snapshot so readers
+            # never see a truncated or half-written file
+            if orjson is not None:
+                payload = orjson.dumps(data)
+            else:
+                payload = json.dumps(data, separators=(',', ':')).encode()
+
+            tmp_path = SHARED_DATA_PATH + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, SHARED_DATA_PATH)
 
         except Exception as e:
             logger.error(f"Failed to save prices: {e}")
 
-    def _check_risk_triggers(self, symbol, exchange, ltp):
-        """Check if stop-loss or take-profit should be triggered"""
-        try:
-            from app import create_app, db
-            from app.models import StrategyExecution, Strategy
-
-            app = create_app()
-            with app.app_context():
-                # Find open positions for this symbol
-                open_positions = StrategyExecution.query.filter(
-                    StrategyExecution.status == 'entered',
-                    StrategyExecution.symbol == symbol
-                ).all()
+    @staticmethod
+    def _trigger_band(side, sl_price, tp_price):
+        """
+        LTP band inside which neither stop-loss nor take-profit can fire
 
-                for position in open_positions:
-                    strategy = position.strategy
-                    if not strategy:
-                        continue
+        Ticks strictly inside (trigger_low, trigger_high) need no threshold checks.
 
-                    entry_price = position.entry_price or 0
-                    qty = position.quantity or 0
-                    side = position.side  # BUY or SELL
+        Returns:
+            Tuple of (trigger_low, trigger_high), infinite on sides with no trigger
+        """
+        if side == 'BUY':
+            low, high = sl_price, tp_price
+        else:
+            low, high = tp_price, sl_price
+        return (-math.inf if low is None else low), (math.inf if high is None else high)
 
-                    # Calculate current P&L
-                    if side == 'BUY':
-                        pnl = (ltp - entry_price) * qty
-                    else:
-                        pnl = (entry_price - ltp) * qty
+    def _check_risk_triggers(self, prices):
+        """
+        Update P&L of open positions for the flushed symbols and check
+        stop-loss/take-profit against the cached risk inputs, committing
+        P&L once for the whole flush and handing exits to the exit executor
+
+        Args:
+            prices: Dict of {(exchange, symbol): ltp}
+        """
+        positions_by_key = self._positions_by_key
+        last_persisted = self._last_persisted
+
+        now = datetime.utcnow()
+        now_mono = time.monotonic()
+        updates = []
+        triggered = []
+        for (exchange, symbol), ltp in prices.items():
+            for position in positions_by_key.get((exchange, symbol), ()):
+                exec_id, strategy_id, sl_price, tp_price, side, entry_price, qty, low, high = position
+
+                # Calculate current P&L
+                if side == 'BUY':
+                    pnl = (ltp - entry_price) * qty
+                else:
+                    pnl = (entry_price - ltp) * qty
 
-                    # Update position P&L in database
-                    position.current_price = ltp
-                    position.unrealized_pnl = pnl
-                    db.session.commit()
+                exit_triggered = False
 
+                # Thresholds only matter once the LTP leaves the precomputed band
+                if not low < ltp < high:
                     # Check stop-loss
-                    stop_loss = strategy.stop_loss
-                    if stop_loss and pnl <= -abs(stop_loss):
-                        logger.warning(f"[STOP-LOSS] Triggered for {symbol}: P&L={pnl}, Stop={stop_loss}")
-                        self._trigger_exit(position, 'stop_loss')
+                    if sl_price is not None and (ltp <= sl_price if side == 'BUY' else ltp >= sl_price):
+                        logger.warning(f"[STOP-LOSS] Triggered for {exchange}:{symbol}: LTP={ltp}, Stop={sl_price}, P&L={pnl}")
+                        triggered.append((exec_id, strategy_id, 'stop_loss', sl_price, ltp))
+                        exit_triggered = True
+
+                    # Check take-profit (a stop-loss on the same tick wins)
+                    elif tp_price is not None and (ltp >= tp_price if side == 'BUY' else ltp <= tp_price):
+                        logger.info(f"[TAKE-PROFIT] Triggered for {exchange}:{symbol}: LTP={ltp}, Target={tp_price}, P&L={pnl}")
+                        triggered.append((exec_id, strategy_id, 'take_profit', tp_price, ltp))
+                        exit_triggered = True
+
+                # Persist only visible changes: P&L moved by more than
+                # PNL_PERSIST_CHANGE, or PNL_PERSIST_INTERVAL elapsed, or an exit fired
+                last = last_persisted.get(exec_id)
+                if (exit_triggered or last is None
+                        or now_mono - last[1] >= PNL_PERSIST_INTERVAL
+                        or abs(pnl - last[0]) / max(1.0, abs(last[0])) > PNL_PERSIST_CHANGE):
+                    updates.append({
+                        'b_id': exec_id,
+                        'b_px': ltp,
+                        'b_ts': now,
+                        'b_pnl': pnl
+                    })
 
-                    # Check take-profit
-                    take_profit = strategy.take_profit
-                    if take_profit and pnl >= abs(take_profit):
-                        logger.info(f"[TAKE-PROFIT] Triggered for {symbol}: P&L={pnl}, Target={take_profit}")
-                        self._trigger_exit(position, 'take_profit')
+        if not updates:
+            return
+
+        if triggered:
+            # Fired exits stop checking thresholds. The read-modify-swap runs
+            # under the cache lock so a concurrent refresh cannot undo it; the
+            # refresh keeps them disarmed until sl_hit_at/tp_hit_at is visible
+            # (or re-arms them if the exit failed to persist)
+            with self._cache_lock:
+                triggered = [args for args in triggered if args[0] not in self._fired_exits]
+                for exec_id, *_ in triggered:
+                    self._fired_exits[exec_id] = None
+                fired = self._fired_exits
+                self._positions_by_key = {
+                    key: tuple(
+                        self._disarmed(position) if position.execution_id in fired else position
+                        for position in positions
+                    )
+                    for key, positions in self._positions_by_key.items()
+                }
+
+            # Hand exits to the executor as plain values (no session-bound
+            # objects); each one commits in its own app context
+            for exit_args in triggered:
+                try:
+                    self._db_executor.submit(self._trigger_exit, *exit_args)
+                except RuntimeError:
+                    # stop() already shut the executor down (a last flush
+                    # racing shutdown): record the exit here rather than lose it
+                    logger.warning(f"Exit executor stopped, recording exit for position {exit_args[0]} inline")
+                    self._trigger_exit(*exit_args)
+
+        try:
+            with self._app.app_context():
+                # Update position P&L in database without loading the rows
+                db.session.execute(UPDATE_PNL, updates)
+                db.session.commit()
+
+            for row in updates:
+                last_persisted[row['b_id']] = (row['b_pnl'], now_mono)
 
         except Exception as e:
             logger.error(f"Error checking risk triggers: {e}")
 
-    def _trigger_exit(self, position, reason):
-        """Trigger exit order for position"""
+    @staticmethod
+    def _disarmed(position):
+        """Copy of a position snapshot with its exit thresholds cleared"""
+        return position._replace(sl_price=None, tp_price=None,
+                                 trigger_low=-math.inf, trigger_high=math.inf)
+
+    def _trigger_exit(self, exec_id, strategy_id, reason, threshold, ltp):
+        """Record the exit for a position (runs on the exit executor)"""
         try:
-            from app import create_app, db
-            from app.models import RiskEvent
+            with self._app.app_context():
+                # Mark position for exit (the main app's risk monitor places the
+                # exit order for an open position with sl_hit_at/tp_hit_at set).
+                # Skip positions the main app already marked or closed.
+                position = db.session.get(StrategyExecution, exec_id)
+                if (position is None or position.status != 'entered' or position.exit_order_id
+                        or position.sl_hit_at or position.tp_hit_at):
+                    return
 
-            app = create_app()
-            with app.app_context():
                 # Log risk event
                 risk_event = RiskEvent(
-                    strategy_id=position.strategy_id,
-                    execution_id=position.id,
+                    strategy_id=strategy_id,
+                    execution_id=exec_id,
                     event_type=reason,
-                    trigger_value=position.unrealized_pnl,
-                    action_taken='exit_triggered',
-                    created_at=datetime.utcnow()
+                    threshold_value=threshold,
+                    current_value=ltp,
+                    action_taken='exit_triggered'
                 )
                 db.session.add(risk_event)
-                db.session.commit()
 
-                # Execute exit (this will be handled by the strategy executor)
-                logger.info(f"Exit triggered for position {position.id}: {reason}")
+                logger.info(f"Exit triggered for position {exec_id}: {reason}")
 
-                # Mark position for exit (the main app will pick this up)
                 position.exit_reason = reason
-                position.exit_triggered_at = datetime.utcnow()
+                if reason == 'stop_loss':
+                    position.sl_hit_at = datetime.utcnow()
+                    position.sl_hit_price = ltp
+                else:
+                    position.tp_hit_at = datetime.utcnow()
+                    position.tp_hit_price = ltp
+
                 db.session.commit()
 
         except Exception as e:
-            logger.error(f"Error triggering exit: {e}")
+            logger.error(f"Error recording exit for position {exec_id}: {e}")
+        finally:
+            # The outcome is visible to any refresh that starts from now on
+            with self._cache_lock:
+                if exec_id in self._fired_exits:
+                    self._fired_exits[exec_id] = self._refresh_gen
 
     def run(self):
         """Main service loop with trading hours awareness"""
@@ -556,38 +994,46 @@ class StandaloneWebSocketService:
             logger.error("Failed to load configuration, exiting")
             return
 
-        # Main loop - refresh subscriptions periodically
-        refresh_interval = 60  # seconds
+        self._flush_thread = threading.Thread(target=self._flush_loop, name='TickFlusher', daemon=True)
+        self._flush_thread.start()
+        self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name='PriceSnapshot', daemon=True)
+        self._snapshot_thread.start()
+
+        # Main loop - sleeps until the next scheduled event (session close,
+        # subscription refresh or next market open) instead of polling
         last_refresh = time.time()
         was_trading_hours = False
 
         while not self._shutdown:
             try:
                 # Check if within trading hours
-                is_trading = self.is_trading_hours()
+                window = self._current_window()
 
-                if is_trading:
+                if window is not None:
                     # Within trading hours - connect if not connected
                     if not was_trading_hours:
                         logger.info("Trading hours started - connecting WebSocket...")
                         if not self.connect():
                             logger.error("Failed to connect, will retry in 30 seconds...")
-                            time.sleep(30)
+                            self._shutdown_event.wait(30)
                             continue
 
                         # Subscribe to positions after connection
                         self.subscribe_to_positions()
                         was_trading_hours = True
+                        last_refresh = time.time()
 
                     # Refresh subscriptions periodically
                     current_time = time.time()
-                    if current_time - last_refresh >= refresh_interval:
+                    if current_time - last_refresh >= SUBSCRIPTION_REFRESH_INTERVAL:
                         if self.connected:
                             logger.info("Refreshing subscriptions...")
                             self.subscribe_to_positions()
                         last_refresh = current_time
 
-                    time.sleep(1)
+                    # Wake for the next refresh or just past the window close
+                    next_event_ts = min(last_refresh + SUBSCRIPTION_REFRESH_INTERVAL, window[1] + 1)
+                    self._shutdown_event.wait(max(0.0, next_event_ts - time.time()))
 
                 else:
                     # Outside trading hours - disconnect and sleep
@@ -596,27 +1042,29 @@ class StandaloneWebSocketService:
                         self.stop_websocket()
                         was_trading_hours = False
 
-                    # Calculate time until next market open
-                    wait_seconds = self.get_time_until_market_open()
+                    # Wake at the next window open today (special sessions
+                    # included), else the next regular market open
+                    now_ts = time.time()
+                    upcoming = [open_ts for open_ts, _ in self._today_windows if open_ts > now_ts]
+                    if upcoming:
+                        wait_seconds = min(upcoming) - now_ts
+                    else:
+                        wait_seconds = self.get_time_until_market_open()
 
-                    # Cap at 1 hour to periodically recheck
-                    wait_seconds = min(wait_seconds, 3600)
+                    # Cap at 1 hour to periodically recheck, and wake when
+                    # today's windows expire so they are rebuilt
+                    wait_seconds = int(max(1, min(wait_seconds, 3600, self._windows_valid_until - now_ts)))
 
                     now = datetime.now(self.ist)
                     next_check = now + timedelta(seconds=wait_seconds)
                     logger.info(f"Outside trading hours. Sleeping until {next_check.strftime('%Y-%m-%d %H:%M:%S')} IST ({wait_seconds} seconds)")
 
-                    # Sleep in chunks to allow for graceful shutdown
-                    sleep_chunk = 60  # Check for shutdown every 60 seconds
-                    remaining = wait_seconds
-                    while remaining > 0 and not self._shutdown:
-                        sleep_time = min(sleep_chunk, remaining)
-                        time.sleep(sleep_time)
-                        remaining -= sleep_time
+                    # Returns early when stop() sets the event
+                    self._shutdown_event.wait(wait_seconds)
 
             except Exception as e:
                 logger.error(f"Error in main loop: {e}")
-                time.sleep(5)
+                self._shutdown_event.wait(5)
 
         logger.info("WebSocket Service stopped")
 
@@ -624,8 +1072,9 @@ class StandaloneWebSocketService:
         """Stop WebSocket connection without shutting down service"""
         self.connected = False
         self.subscriptions.clear()
-        self.latest_prices.clear()
+        self._subscriptions_snapshot = ()
 
+        # Disconnect first so no callback writes while the table is cleared
         if self.client:
             try:
                 self.client.disconnect()
@@ -633,12 +1082,26 @@ class StandaloneWebSocketService:
                 logger.warning(f"Error disconnecting client: {e}")
             self.client = None
 
+        # Discard ticks still queued for the closed connection
+        self._drain_ticks([])
+        with self._lock:
+            self.latest_prices.clear()
+        self._price_writer.clear()
+
         logger.info("WebSocket disconnected (outside trading hours)")
 
     def stop(self):
         """Stop the service"""
         self._shutdown = True
+        self._shutdown_event.set()
+        # Last snapshot, synced to disk, before the connection state is cleared;
+        # the snapshot thread must be out of its write (it wakes within 1 s)
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join(timeout=2)
+        self._save_prices(durable=True)
         self.stop_websocket()
+        # Let exits already handed off finish persisting
+        self._db_executor.shutdown(wait=True)
         logger.info("WebSocket service stopped")
 
 